@@ -1,7 +1,23 @@
 import os
 from celery import Celery
+from celery.schedules import crontab
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "bookStore.settings")
 app = Celery("bookStore")
 app.config_from_object("django.conf:settings", namespace="CELERY")
 app.autodiscover_tasks()
+
+app.conf.beat_schedule = {
+    "train-recommendation-model": {
+        "task": "myApp.tasks.train_recommendation_model",
+        "schedule": crontab(hour=3, minute=0),
+    },
+    "refresh-user-recommendations": {
+        "task": "myApp.tasks.refresh_user_recommendations",
+        "schedule": crontab(minute=30),
+    },
+    "requeue-stripe-events": {
+        "task": "payment.tasks.requeue_stripe_events",
+        "schedule": crontab(minute="*/15"),
+    },
+}
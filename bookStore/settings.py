@@ -54,6 +54,7 @@ INSTALLED_APPS = [
     "cart",
     "order",
     "payment",
+    "mailer",
 ]
 
 MIDDLEWARE = [
@@ -155,6 +156,30 @@ STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Absolute base for links that leave the site, like the receipt QR code
+SITE_URL = config("SITE_URL", default="http://127.0.0.1:8000")
+
+# Receipts are only served through the order:receipt view, which checks the
+# owner and then hands the transfer to the front-end server:
+# "x-accel-redirect" for nginx (with an internal location at
+# RECEIPT_SENDFILE_PREFIX aliasing MEDIA_ROOT) or "x-sendfile" for Apache and
+# lighttpd. Left empty, Django streams the file itself.
+RECEIPT_SENDFILE = config("RECEIPT_SENDFILE", default="")
+RECEIPT_SENDFILE_PREFIX = config("RECEIPT_SENDFILE_PREFIX", default="/protected-media/")
+
+# Cache (shared by all workers: catalog fragments, throttling)
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/2"),
+    }
+}
+
+# Trained recommendation model artifacts
+RECOMMENDER_MODEL_DIR = config(
+    "RECOMMENDER_MODEL_DIR", default=str(BASE_DIR / "recommender")
+)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -228,6 +253,14 @@ AUTH_USER_MODEL = "registration.CustomUser"
 # CELERY REDIS
 CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
 CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND", "redis://localhost:6379/1")
+# Receipt stages get their own queues so slow SMTP never holds a render slot;
+# see the celery-render and celery-io workers in docker-compose.yml
+CELERY_TASK_ROUTES = {
+    "payment.tasks.render_receipt_pdf": {"queue": "receipts_render"},
+    "payment.tasks.render_receipt_qr": {"queue": "receipts_render"},
+    "payment.tasks.store_receipt_files": {"queue": "receipts_storage"},
+    "payment.tasks.send_receipt_email": {"queue": "mail"},
+}
 
 
 # Email
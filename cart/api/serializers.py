@@ -1,7 +1,9 @@
 from rest_framework import serializers
+from cart.item_count import invalidate_cart_item_count
 from cart.models import Cart, CartItem
 from myApp.models import Book
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 
 
@@ -71,31 +73,96 @@ class CreateCartItemSerializer(serializers.ModelSerializer):
 
     def validate(self, attrs):
         user = self.context["request"].user
-        cart = get_object_or_404(Cart, user=user)
-        book = attrs["book"]
-        new_quantity = attrs["quantity"]
-
-        # check if item already exists in cart
-        existing_item = CartItem.objects.filter(cart=cart, book=book).first()
-        total_quantity = new_quantity + (existing_item.quantity if existing_item else 0)
+        self.cart = get_object_or_404(Cart, user=user)
+        # Fail fast on the request alone; the total including what is
+        # already in the cart is checked by the write itself
         try:
-            book.quantity_stock_check(total_quantity)
+            attrs["book"].quantity_stock_check(attrs["quantity"])
         except ValueError as e:
             raise serializers.ValidationError(str(e))
         return attrs
 
     def create(self, validated_data):
-        user = self.context["request"].user
-        cart = get_object_or_404(Cart, user=user)
         book = validated_data["book"]
-        quantity = validated_data["quantity"]
-
-        cart_item, created = CartItem.objects.get_or_create(
-            cart=cart, book=book, defaults={"quantity": quantity}
+        added = CartItem.objects.add_quantity(
+            self.cart.pk, book.pk, validated_data["quantity"]
         )
+        if added is None:
+            raise serializers.ValidationError(f"Only {book.stock} items available.")
+
+        item_id, quantity = added
+        invalidate_cart_item_count(self.cart.user_id)
+        return CartItem(pk=item_id, cart=self.cart, book=book, quantity=quantity)
+
+
+class BulkCartItemSerializer(serializers.Serializer):
+    """One entry of a bulk add. Books are resolved in bulk by the parent."""
+
+    book = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+
+
+class BulkAddCartItemsSerializer(serializers.Serializer):
+    """A POST method serializer for adding many books to the cart at once."""
 
-        if not created:
-            cart_item.quantity += quantity
-            cart_item.save()
+    ADDED = "added"
+    NOT_FOUND = "not_found"
+    OUT_OF_STOCK = "out_of_stock"
+
+    items = BulkCartItemSerializer(many=True, allow_empty=False, max_length=100)
+
+    def validate(self, attrs):
+        user = self.context["request"].user
+        self.cart = get_object_or_404(Cart, user=user)
+        return attrs
+
+    @transaction.atomic
+    def create(self, validated_data):
+        """
+        Add every item that exists and fits in stock, and report what happened
+        to each one. A book listed twice is added once with the summed quantity.
+        """
+        requested = {}
+        for item in validated_data["items"]:
+            requested[item["book"]] = requested.get(item["book"], 0) + item["quantity"]
+
+        books = Book.objects.in_bulk(list(requested))
+        # Lock the rows already in the cart for the report below. The write
+        # adds to whatever each row holds when it lands, so a concurrent add,
+        # even of a row that did not exist yet, is never overwritten
+        in_cart = dict(
+            CartItem.objects.select_for_update()
+            .filter(cart=self.cart, book_id__in=list(books))
+            .values_list("book_id", "quantity")
+        )
+        added = CartItem.objects.add_quantities(
+            self.cart.pk,
+            {
+                book_id: quantity
+                for book_id, quantity in requested.items()
+                if book_id in books
+            },
+        )
 
-        return cart_item
+        results = []
+        for book_id in requested:
+            book = books.get(book_id)
+            if book is None:
+                results.append({"book": book_id, "status": self.NOT_FOUND})
+            elif book_id in added:
+                results.append(
+                    {"book": book_id, "status": self.ADDED, "quantity": added[book_id]}
+                )
+            else:
+                results.append(
+                    {
+                        "book": book_id,
+                        "status": self.OUT_OF_STOCK,
+                        "available": book.stock,
+                        "quantity": in_cart.get(book_id, 0),
+                    }
+                )
+
+        if added:
+            invalidate_cart_item_count(self.cart.user_id)
+        return results
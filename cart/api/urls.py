@@ -7,4 +7,9 @@ app_name = "cart"
 urlpatterns = [
     path("cart/", views.CartAPIView.as_view(), name="cart_list_api"),
     path("cart/add-item/", views.CartItemAPIView.as_view(), name="add_item_api"),
+    path(
+        "cart/add-items/",
+        views.BulkCartItemAPIView.as_view(),
+        name="add_items_api",
+    ),
 ]
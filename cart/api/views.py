@@ -1,4 +1,5 @@
 from .serializers import (
+    BulkAddCartItemsSerializer,
     CartItemSerializer,
     CreateCartSerializer,
     CreateCartItemSerializer,
@@ -66,3 +67,20 @@ class CartItemAPIView(APIView):
             },
             status=status.HTTP_200_OK,
         )
+
+
+class BulkCartItemAPIView(APIView):
+    """
+    A View for adding many books to your cart in one request.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        """Add a list of {book, quantity} and report the outcome of each."""
+        serializer = BulkAddCartItemsSerializer(
+            data=request.data, context={"request": request}
+        )
+        serializer.is_valid(raise_exception=True)
+        results = serializer.save()
+        return Response({"results": results}, status=status.HTTP_200_OK)
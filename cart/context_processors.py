@@ -1,16 +1,10 @@
-from cart.models import Cart
-from django.db.models import Sum
+from cart.item_count import get_cart_item_count
+from cart.session import get_session_cart
 
 
 def cart_item_count(request):
     if request.user.is_authenticated:
-        try:
-            cart = Cart.objects.get(user=request.user)
-            total_items = cart.items.aggregate(total=Sum("quantity"))["total"] or 0
-        except Cart.DoesNotExist:
-            total_items = 0
-        return {"cart_item_count": total_items}
+        return {"cart_item_count": get_cart_item_count(request.user)}
 
-    cart = request.session.get("cart", {})
-    total_items = sum(cart.values())
+    total_items = sum(get_session_cart(request.session).values())
     return {"cart_item_count": total_items}
@@ -0,0 +1,47 @@
+"""
+Per-user cache of the number of items in the cart.
+
+The navbar shows the count on every page, so it is read from the cache and
+only recomputed after a change to the cart has cleared it.
+"""
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum
+
+from .models import CartItem
+
+# A reader that counted before a change committed can still store its stale
+# count after the refresh below; the timeout bounds how long that can last
+CART_ITEM_COUNT_TIMEOUT = 5 * 60
+
+
+def _count_key(user_id):
+    return f"cart-item-count:{user_id}"
+
+
+def _count(user_id):
+    items = CartItem.objects.filter(cart__user_id=user_id)
+    return items.aggregate(total=Sum("quantity"))["total"] or 0
+
+
+def get_cart_item_count(user):
+    """Return the total quantity in user's cart, from the cache when possible."""
+    key = _count_key(user.pk)
+    count = cache.get(key)
+    if count is None:
+        count = _count(user.pk)
+        cache.set(key, count, timeout=CART_ITEM_COUNT_TIMEOUT)
+    return count
+
+
+def invalidate_cart_item_count(user_id):
+    """
+    Store the fresh count once the current transaction commits, so the
+    count from before the change does not outlive it.
+    """
+
+    def refresh():
+        cache.set(_count_key(user_id), _count(user_id), CART_ITEM_COUNT_TIMEOUT)
+
+    transaction.on_commit(refresh)
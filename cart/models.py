@@ -1,10 +1,30 @@
-from django.db import models
+from decimal import Decimal
+
+from django.db import connections, models
+from django.db.models import DecimalField, F, Sum, Value
+from django.db.models.functions import Coalesce
 from django.conf import settings
+from django.utils import timezone
+
+
+class CartQuerySet(models.QuerySet):
+    def with_totals(self):
+        """Annotate total_cost and total_quantity, computed in the database."""
+        return self.annotate(
+            total_cost=Coalesce(
+                Sum(F("items__quantity") * F("items__book__price")),
+                Value(Decimal("0.00")),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            ),
+            total_quantity=Coalesce(Sum("items__quantity"), 0),
+        )
 
 
 class Cart(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
 
+    objects = CartQuerySet.as_manager()
+
     def get_total_cost(self):
         return sum(item.get_cost() for item in self.items.all())
 
@@ -12,6 +32,74 @@ class Cart(models.Model):
         return self.user.email
 
 
+class CartItemQuerySet(models.QuerySet):
+    def add_quantity(self, cart_id, book_id, quantity):
+        """
+        Add quantity of a book to a cart in one INSERT ... ON CONFLICT
+        statement, only if the book exists and has enough stock for the new
+        total. Returns (item id, new quantity), or None if nothing was written.
+        """
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        item_table = qn(self.model._meta.db_table)
+        book_table = qn(self.model.book.field.related_model._meta.db_table)
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+
+        sql = (
+            f"INSERT INTO {item_table} "
+            "(cart_id, book_id, quantity, created_at, updated_at) "
+            f"SELECT %s, id, %s, %s, %s FROM {book_table} "
+            "WHERE id = %s AND stock >= %s "
+            "ON CONFLICT (cart_id, book_id) DO UPDATE SET "
+            f"quantity = {item_table}.quantity + excluded.quantity, "
+            "updated_at = excluded.updated_at "
+            f"WHERE {item_table}.quantity + excluded.quantity <= "
+            f"(SELECT stock FROM {book_table} WHERE id = excluded.book_id) "
+            "RETURNING id, quantity"
+        )
+        params = [cart_id, quantity, now, now, book_id, quantity]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchone()
+
+    def add_quantities(self, cart_id, quantities):
+        """
+        Like add_quantity, for a {book id: quantity} mapping in a single
+        statement. Each book is added to what is in the cart when the row is
+        written, and only if it has stock for the new total. Returns
+        {book id: new quantity} for the books that were written.
+        """
+        if not quantities:
+            return {}
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        item_table = qn(self.model._meta.db_table)
+        book_table = qn(self.model.book.field.related_model._meta.db_table)
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+
+        values = ", ".join(["(%s, %s)"] * len(quantities))
+        sql = (
+            f"INSERT INTO {item_table} "
+            "(cart_id, book_id, quantity, created_at, updated_at) "
+            f"SELECT %s, {book_table}.id, requested.column2, %s, %s "
+            f"FROM {book_table} JOIN (VALUES {values}) AS requested "
+            f"ON {book_table}.id = requested.column1 "
+            f"WHERE {book_table}.stock >= requested.column2 "
+            "ON CONFLICT (cart_id, book_id) DO UPDATE SET "
+            f"quantity = {item_table}.quantity + excluded.quantity, "
+            "updated_at = excluded.updated_at "
+            f"WHERE {item_table}.quantity + excluded.quantity <= "
+            f"(SELECT stock FROM {book_table} WHERE id = excluded.book_id) "
+            "RETURNING book_id, quantity"
+        )
+        params = [cart_id, now, now]
+        for book_id, quantity in quantities.items():
+            params += [book_id, quantity]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return dict(cursor.fetchall())
+
+
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, related_name="items", on_delete=models.CASCADE)
     book = models.ForeignKey(
@@ -21,6 +109,15 @@ class CartItem(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CartItemQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["cart", "book"], name="unique_cart_item_book"
+            )
+        ]
+
     def __str__(self):
         return self.book.title
 
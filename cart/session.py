@@ -0,0 +1,26 @@
+"""
+The guest cart kept in the session.
+
+It is stored as two parallel arrays, {"ids": [...], "qty": [...]}, rather
+than a {"<id>": qty} mapping, which keeps the payload small for cookie and
+cache session backends. Sessions written in the old mapping form are still
+read, and are rewritten in the new form the next time the cart changes.
+"""
+
+SESSION_KEY = "cart"
+
+
+def get_session_cart(session):
+    """Return the guest cart as an ordered {book_id: quantity} dict."""
+    data = session.get(SESSION_KEY) or {}
+    if "ids" in data:
+        return dict(zip(data["ids"], data["qty"]))
+    return {int(book_id): int(quantity) for book_id, quantity in data.items()}
+
+
+def save_session_cart(session, cart):
+    """Store a {book_id: quantity} dict as the guest cart."""
+    if cart:
+        session[SESSION_KEY] = {"ids": list(cart), "qty": list(cart.values())}
+    else:
+        session[SESSION_KEY] = {}
@@ -1,29 +1,54 @@
 from django.contrib.auth.signals import user_logged_in
+from django.db import transaction
 from django.dispatch import receiver
+from myApp.models import Book
+from .item_count import invalidate_cart_item_count
 from .models import Cart, CartItem
+from .session import get_session_cart, save_session_cart
 
 
 @receiver(user_logged_in)
 def merge_carts_on_login(sender, user, request, **kwargs):
     """
     Merge session cart into authenticated user's cart after login.
+
+    Quantities are summed with what the user already has and clamped to the
+    stock available; books that no longer exist are dropped. The whole merge
+    is a fixed number of queries however many books the guest cart holds.
     """
-    session_cart = request.session.get("cart", {})
+    requested = get_session_cart(request.session)
 
-    if not session_cart:
+    if not requested:
         return  # No guest cart to merge
 
-    # Get or create user's cart
-    user_cart, _ = Cart.objects.get_or_create(user=user)
+    with transaction.atomic():
+        # Get or create user's cart, locked until the merge is written
+        user_cart, _ = Cart.objects.select_for_update().get_or_create(user=user)
+        stock = dict(Book.objects.filter(pk__in=requested).values_list("id", "stock"))
+        existing = {
+            item.book_id: item for item in user_cart.items.filter(book_id__in=stock)
+        }
+
+        new_items = []
+        changed_items = []
+        for book_id, available in stock.items():
+            item = existing.get(book_id)
+            current = item.quantity if item else 0
+            quantity = min(current + requested[book_id], available)
+            if item is None:
+                if quantity > 0:
+                    new_items.append(
+                        CartItem(cart=user_cart, book_id=book_id, quantity=quantity)
+                    )
+            elif quantity != current:
+                item.quantity = quantity
+                changed_items.append(item)
 
-    for book_id, quantity in session_cart.items():
-        # Get or create cart item
-        item, created = CartItem.objects.get_or_create(cart=user_cart, book_id=book_id)
-        if not created:
-            item.quantity += quantity
-        else:
-            item.quantity = quantity
-        item.save()
+        if new_items:
+            CartItem.objects.bulk_create(new_items)
+        if changed_items:
+            CartItem.objects.bulk_update(changed_items, ["quantity"])
+        invalidate_cart_item_count(user.pk)
 
     # Clear session cart
-    request.session["cart"] = {}
+    save_session_cart(request.session, {})
@@ -1,7 +1,9 @@
+from unittest.mock import patch
+
 import pytest
 from django.urls import reverse
 from rest_framework import status
-from cart.models import Cart, CartItem
+from cart.models import Cart, CartItem, CartItemQuerySet
 
 
 # --- FIXTURE FOR URLS ---
@@ -104,3 +106,98 @@ def test_add_item_api_stock_error(api_client, create_user, create_book, add_item
     assert response.status_code == status.HTTP_400_BAD_REQUEST
     # Serializer errors usually come in a dict
     assert len(response.data) > 0  # Should contain error message
+
+
+# --- BULK ADD ---
+
+
+@pytest.mark.django_db
+def test_bulk_add_items_reports_each_outcome(
+    api_client, create_user, create_book, django_assert_max_num_queries
+):
+    """Test POST /api/v1/cart/add-items/ adds what it can in one go."""
+    user = create_user(email="bulk@test.com", password="pw")
+    cart = Cart.objects.create(user=user)
+    existing = create_book(title="In Cart", stock=5)
+    fresh = create_book(title="Fresh", stock=5)
+    rare = create_book(title="Rare", stock=1)
+    CartItem.objects.create(cart=cart, book=existing, quantity=2)
+    api_client.force_authenticate(user=user)
+
+    payload = {
+        "items": [
+            {"book": existing.id, "quantity": 3},
+            {"book": fresh.id, "quantity": 1},
+            {"book": fresh.id, "quantity": 1},
+            {"book": rare.id, "quantity": 2},
+            {"book": 999, "quantity": 1},
+        ]
+    }
+    with django_assert_max_num_queries(8):
+        response = api_client.post(
+            reverse("cart_api:add_items_api"), payload, format="json"
+        )
+
+    assert response.status_code == status.HTTP_200_OK
+    outcomes = {item["book"]: item for item in response.data["results"]}
+    assert outcomes[existing.id] == {
+        "book": existing.id,
+        "status": "added",
+        "quantity": 5,
+    }
+    assert outcomes[fresh.id]["quantity"] == 2
+    assert outcomes[rare.id]["status"] == "out_of_stock"
+    assert outcomes[rare.id]["available"] == 1
+    assert outcomes[999]["status"] == "not_found"
+
+    quantities = dict(cart.items.values_list("book_id", "quantity"))
+    assert quantities == {existing.id: 5, fresh.id: 2}
+
+
+@pytest.mark.django_db
+def test_bulk_add_items_keeps_a_concurrent_single_add(
+    api_client, create_user, create_book
+):
+    """Test a single add landing between the bulk read and write is kept."""
+    user = create_user(email="race@test.com", password="pw")
+    cart = Cart.objects.create(user=user)
+    held = create_book(title="Held", stock=10)
+    fresh = create_book(title="Fresh", stock=10)
+    CartItem.objects.create(cart=cart, book=held, quantity=1)
+    api_client.force_authenticate(user=user)
+    add_quantities = CartItemQuerySet.add_quantities
+
+    def single_adds_first(queryset, cart_id, quantities):
+        CartItem.objects.add_quantity(cart_id, held.pk, 2)
+        CartItem.objects.add_quantity(cart_id, fresh.pk, 4)
+        return add_quantities(queryset, cart_id, quantities)
+
+    payload = {
+        "items": [
+            {"book": held.id, "quantity": 3},
+            {"book": fresh.id, "quantity": 1},
+        ]
+    }
+    with patch.object(CartItemQuerySet, "add_quantities", single_adds_first):
+        response = api_client.post(
+            reverse("cart_api:add_items_api"), payload, format="json"
+        )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert [item["quantity"] for item in response.data["results"]] == [6, 5]
+    quantities = dict(cart.items.values_list("book_id", "quantity"))
+    assert quantities == {held.id: 6, fresh.id: 5}
+
+
+@pytest.mark.django_db
+def test_bulk_add_items_rejects_empty_list(api_client, create_user):
+    """Test an empty item list is a validation error."""
+    user = create_user(email="empty-bulk@test.com", password="pw")
+    Cart.objects.create(user=user)
+    api_client.force_authenticate(user=user)
+
+    response = api_client.post(
+        reverse("cart_api:add_items_api"), {"items": []}, format="json"
+    )
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
@@ -1,7 +1,9 @@
 import pytest
 from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
 from django.test import RequestFactory
 from cart.context_processors import cart_item_count
+from cart.item_count import invalidate_cart_item_count
 from cart.models import Cart, CartItem
 
 
@@ -82,3 +84,49 @@ def test_cp_authenticated_with_items(rf, create_user, create_book):
 
     context = cart_item_count(request)
     assert context["cart_item_count"] == 7
+
+
+@pytest.mark.django_db
+def test_cp_authenticated_count_is_cached(
+    rf, create_user, create_book, django_assert_num_queries
+):
+    """Test the count costs one query the first time and none after that."""
+    user = create_user(email="cached@test.com", password="pw")
+    cart = Cart.objects.create(user=user)
+    CartItem.objects.create(cart=cart, book=create_book(), quantity=4)
+
+    request = rf.get("/")
+    request.user = user
+
+    with django_assert_num_queries(1):
+        assert cart_item_count(request)["cart_item_count"] == 4
+    with django_assert_num_queries(0):
+        assert cart_item_count(request)["cart_item_count"] == 4
+
+
+@pytest.mark.django_db
+def test_cp_stale_count_is_replaced_on_commit(
+    rf, create_user, create_book, django_capture_on_commit_callbacks
+):
+    """Test a count cached before a change commits is overwritten after it."""
+    user = create_user(email="stale@test.com", password="pw")
+    cart = Cart.objects.create(user=user)
+    request = rf.get("/")
+    request.user = user
+
+    with django_capture_on_commit_callbacks(execute=True):
+        CartItem.objects.create(cart=cart, book=create_book(), quantity=2)
+        invalidate_cart_item_count(user.pk)
+        # A concurrent reader counting before the commit caches 0
+        cache.set(f"cart-item-count:{user.pk}", 0)
+
+    assert cart_item_count(request)["cart_item_count"] == 2
+
+
+def test_cp_anonymous_with_compact_cart(rf):
+    """Test the array-based session cart is summed correctly."""
+    request = rf.get("/")
+    request.user = AnonymousUser()
+    request.session = {"cart": {"ids": [1, 2], "qty": [2, 3]}}
+
+    assert cart_item_count(request)["cart_item_count"] == 5
@@ -2,6 +2,7 @@ import pytest
 from decimal import Decimal
 from cart.models import Cart, CartItem
 from django.core.exceptions import ValidationError
+from django.db import IntegrityError
 
 
 @pytest.mark.django_db
@@ -163,3 +164,92 @@ def test_cart_item_negative_quantity_validation(create_user, create_book):
 
     with pytest.raises(ValidationError):
         item.full_clean()
+
+
+@pytest.mark.django_db
+def test_cart_item_unique_per_book(create_user, create_book):
+    """Test a cart cannot hold two rows for the same book."""
+    cart = Cart.objects.create(user=create_user(email="uniq@test.com", password="pw"))
+    book = create_book()
+    CartItem.objects.create(cart=cart, book=book)
+
+    with pytest.raises(IntegrityError):
+        CartItem.objects.create(cart=cart, book=book)
+
+
+@pytest.mark.django_db
+def test_add_quantity_inserts_then_accumulates(
+    create_user, create_book, django_assert_num_queries
+):
+    """Test add_quantity upserts in a single statement."""
+    cart = Cart.objects.create(user=create_user(email="up@test.com", password="pw"))
+    book = create_book(stock=5)
+
+    with django_assert_num_queries(1):
+        item_id, quantity = CartItem.objects.add_quantity(cart.pk, book.pk, 2)
+    assert quantity == 2
+
+    assert CartItem.objects.add_quantity(cart.pk, book.pk, 3) == (item_id, 5)
+    assert CartItem.objects.get(pk=item_id).quantity == 5
+
+
+@pytest.mark.django_db
+def test_add_quantity_respects_stock(create_user, create_book):
+    """Test nothing is written when the new total would exceed stock."""
+    cart = Cart.objects.create(user=create_user(email="cap@test.com", password="pw"))
+    book = create_book(stock=5)
+
+    assert CartItem.objects.add_quantity(cart.pk, book.pk, 6) is None
+    assert not CartItem.objects.exists()
+
+    CartItem.objects.add_quantity(cart.pk, book.pk, 4)
+    assert CartItem.objects.add_quantity(cart.pk, book.pk, 2) is None
+    assert CartItem.objects.get().quantity == 4
+
+
+@pytest.mark.django_db
+def test_add_quantity_missing_book(create_user):
+    """Test an unknown book id writes nothing."""
+    cart = Cart.objects.create(user=create_user(email="gone@test.com", password="pw"))
+
+    assert CartItem.objects.add_quantity(cart.pk, 999, 1) is None
+    assert not CartItem.objects.exists()
+
+
+@pytest.mark.django_db
+def test_add_quantities_adds_what_fits(
+    create_user, create_book, django_assert_num_queries
+):
+    """Test add_quantities upserts many books in a single statement."""
+    cart = Cart.objects.create(user=create_user(email="many@test.com", password="pw"))
+    held = create_book(stock=5)
+    fresh = create_book(stock=5)
+    short = create_book(stock=1)
+    CartItem.objects.create(cart=cart, book=held, quantity=2)
+
+    with django_assert_num_queries(1):
+        added = CartItem.objects.add_quantities(
+            cart.pk, {held.pk: 3, fresh.pk: 1, short.pk: 2, 999: 1}
+        )
+
+    assert added == {held.pk: 5, fresh.pk: 1}
+    assert dict(cart.items.values_list("book_id", "quantity")) == added
+    assert CartItem.objects.add_quantities(cart.pk, {held.pk: 1}) == {}
+    assert CartItem.objects.add_quantities(cart.pk, {}) == {}
+
+
+@pytest.mark.django_db
+def test_cart_with_totals(create_user, create_book):
+    """Test the database-side totals use the current book prices."""
+    cart = Cart.objects.create(user=create_user(email="tot@test.com", password="pw"))
+    empty = Cart.objects.create(user=create_user(email="none@test.com", password="pw"))
+    CartItem.objects.create(cart=cart, book=create_book(price=10.00), quantity=2)
+    CartItem.objects.create(cart=cart, book=create_book(price=20.00), quantity=1)
+
+    cart = Cart.objects.with_totals().get(pk=cart.pk)
+    assert cart.total_cost == Decimal("40.00")
+    assert cart.total_quantity == 3
+
+    empty = Cart.objects.with_totals().get(pk=empty.pk)
+    assert empty.total_cost == Decimal("0.00")
+    assert empty.total_quantity == 0
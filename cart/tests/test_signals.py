@@ -79,3 +79,51 @@ def test_signal_does_nothing_if_session_empty(client, create_user):
 
     # Assert that NO cart exists (Since signal returns early)
     assert Cart.objects.filter(user=user).exists() is False
+
+
+# --- 4. STOCK AND STALE BOOKS ---
+# Scenario: my guest cart asks for more than is left, and one book is gone.
+# Result: quantities are clamped to stock and the missing book is dropped.
+
+
+@pytest.mark.django_db
+def test_signal_clamps_to_stock_and_drops_missing_books(
+    client, create_user, create_book
+):
+    """Test the merge never exceeds stock and skips deleted books."""
+    user = create_user(email="clamp@test.com", password="pw")
+    kept = create_book(title="Kept", stock=5)
+    scarce = create_book(title="Scarce", stock=3)
+    cart = Cart.objects.create(user=user)
+    CartItem.objects.create(cart=cart, book=scarce, quantity=2)
+
+    session = client.session
+    session["cart"] = {str(kept.id): 2, str(scarce.id): 4, "999": 1}
+    session.save()
+
+    client.login(email="clamp@test.com", password="pw")
+
+    quantities = dict(cart.items.values_list("book_id", "quantity"))
+    assert quantities == {kept.id: 2, scarce.id: 3}
+
+
+@pytest.mark.django_db
+def test_signal_merge_query_count_is_constant(
+    client, create_user, create_book, django_assert_max_num_queries
+):
+    """Test a large guest cart costs no more queries than a small one."""
+    user = create_user(email="many@test.com", password="pw")
+    books = [create_book(title=f"Book {i}", stock=10) for i in range(30)]
+    cart = Cart.objects.create(user=user)
+    CartItem.objects.bulk_create(
+        CartItem(cart=cart, book=book, quantity=1) for book in books[:15]
+    )
+
+    session = client.session
+    session["cart"] = {str(book.id): 2 for book in books}
+    session.save()
+
+    with django_assert_max_num_queries(20):
+        client.login(email="many@test.com", password="pw")
+
+    assert sorted(cart.items.values_list("quantity", flat=True)) == [2] * 15 + [3] * 15
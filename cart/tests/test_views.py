@@ -18,8 +18,7 @@ def test_cart_add_guest_session(client, create_book):
 
     # Check Session
     session = client.session
-    assert "cart" in session
-    assert session["cart"][str(book.id)] == 2
+    assert session["cart"] == {"ids": [book.id], "qty": [2]}
 
 
 @pytest.mark.django_db
@@ -132,7 +131,7 @@ def test_cart_add_accumulates_quantity(client, create_book):
 
     # 3. Check Session
     session = client.session
-    assert session["cart"][str(book.id)] == 3
+    assert session["cart"] == {"ids": [book.id], "qty": [3]}
 
 
 @pytest.mark.django_db
@@ -197,3 +196,70 @@ def test_security_cannot_delete_others_item(client, create_user, create_book):
 
     # 6. Verify Item still exists
     assert CartItem.objects.filter(id=item_b.id).exists() is True
+
+
+@pytest.mark.django_db
+def test_cart_changes_refresh_item_count(
+    client, create_user, create_book, django_capture_on_commit_callbacks
+):
+    """Test the cached navbar count follows adds and deletes."""
+    user = create_user(email="count@test.com", password="pw")
+    book = create_book(title="Counted Book", stock=10)
+    client.force_login(user)
+    assert client.get(reverse("cart:cart_list")).context["cart_item_count"] == 0
+
+    with django_capture_on_commit_callbacks(execute=True):
+        client.post(reverse("cart:cart_add", args=[book.id]), {"quantity": 3})
+    response = client.get(reverse("cart:cart_list"))
+    assert response.context["cart_item_count"] == 3
+
+    item = CartItem.objects.get(cart__user=user, book=book)
+    with django_capture_on_commit_callbacks(execute=True):
+        client.post(reverse("cart:delete_item", args=[item.id]))
+    assert client.get(reverse("cart:cart_list")).context["cart_item_count"] == 0
+
+
+@pytest.mark.django_db
+def test_cart_add_authenticated_exceeds_stock(client, create_user, create_book):
+    """Test the stock check counts what is already in the DB cart."""
+    user = create_user(email="capped@test.com", password="pw")
+    book = create_book(title="Rare Book", stock=5)
+    client.force_login(user)
+    url = reverse("cart:cart_add", args=[book.id])
+
+    client.post(url, {"quantity": 4})
+    response = client.post(url, {"quantity": 2})
+
+    assert response.url == reverse("myApp:shopping")
+    assert CartItem.objects.get(cart__user=user, book=book).quantity == 4
+
+
+@pytest.mark.django_db
+def test_cart_add_missing_book_authenticated(client, create_user):
+    """Test adding an unknown book returns 404."""
+    client.force_login(create_user(email="missing@test.com", password="pw"))
+    response = client.post(reverse("cart:cart_add", args=[999]), {"quantity": 1})
+    assert response.status_code == 404
+
+
+@pytest.mark.django_db
+def test_session_cart_view_drops_deleted_books(
+    client, create_book, django_assert_max_num_queries
+):
+    """Test a deleted book is pruned from the guest cart instead of a 404."""
+    kept = create_book(price=10)
+    gone = create_book(price=20)
+
+    session = client.session
+    session["cart"] = {"ids": [kept.id, gone.id], "qty": [3, 1]}
+    session.save()
+    gone.delete()
+
+    # Session load, one book query, and the session save with its savepoint
+    with django_assert_max_num_queries(5):
+        response = client.get(reverse("cart:session_cart"))
+
+    assert response.status_code == 200
+    assert response.context["items"] == [(kept, 3)]
+    assert response.context["total"] == 30
+    assert client.session["cart"] == {"ids": [kept.id], "qty": [3]}
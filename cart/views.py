@@ -3,15 +3,15 @@ from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_POST
 from django.contrib import messages
 
+from cart.item_count import invalidate_cart_item_count
 from cart.models import Cart, CartItem
+from cart.session import get_session_cart, save_session_cart
 from myApp.models import Book
 
 
 @require_POST
 def cart_add(request, pk):
     """Add a book to the cart for authenticated or session-based users."""
-    book = get_object_or_404(Book, pk=pk)
-
     # Get quantity from POST, default to 1, ensure it's a positive integer
     try:
         quantity = int(request.POST.get("quantity", 1))
@@ -21,18 +21,20 @@ def cart_add(request, pk):
         messages.warning(request, "Invalid quantity.")
         return redirect("myApp:shopping")
 
-    # Determine current quantity in cart
     if request.user.is_authenticated:
         cart, _ = Cart.objects.get_or_create(user=request.user)
-        existing_item = CartItem.objects.filter(cart=cart, book=book).first()
-        current_quantity = existing_item.quantity if existing_item else 0
-    else:
-        cart = request.session.get("cart", {})
-        pk_str = str(pk)
-        current_quantity = int(cart.get(pk_str, 0))
+        # The stock check happens inside the same statement as the write
+        if CartItem.objects.add_quantity(cart.pk, pk, quantity) is None:
+            book = get_object_or_404(Book, pk=pk)
+            messages.warning(request, f"Only {book.stock} items available.")
+            return redirect("myApp:shopping")
+        invalidate_cart_item_count(request.user.pk)
+        messages.success(request, "Item added to the cart.")
+        return redirect("cart:cart_list")
 
-    # Total quantity after adding
-    total_quantity = current_quantity + quantity
+    book = get_object_or_404(Book, pk=pk)
+    cart = get_session_cart(request.session)
+    total_quantity = cart.get(pk, 0) + quantity
 
     # Stock check
     try:
@@ -41,37 +43,36 @@ def cart_add(request, pk):
         messages.warning(request, str(e))
         return redirect("myApp:shopping")
 
-    # Update cart
-    if request.user.is_authenticated:
-        cart_item, _ = CartItem.objects.get_or_create(cart=cart, book=book)
-        cart_item.quantity = total_quantity
-        cart_item.save()
-        messages.success(request, "Item added to the cart.")
-        return redirect("cart:cart_list")
-    else:
-        cart[pk_str] = total_quantity
-        request.session["cart"] = cart
-        messages.success(request, "Item added to cart!")
-        return redirect("cart:session_cart")
+    cart[pk] = total_quantity
+    save_session_cart(request.session, cart)
+    messages.success(request, "Item added to cart!")
+    return redirect("cart:session_cart")
 
 
 @login_required
 def cart_list(request):
     """Display the cart for authenticated users."""
-    cart, created = Cart.objects.get_or_create(user=request.user)
-    if not created:
-        cart = Cart.objects.prefetch_related("items__book").get(id=cart.id)
+    cart, _ = Cart.objects.get_or_create(user=request.user)
+    cart = Cart.objects.with_totals().prefetch_related("items__book").get(id=cart.id)
 
     return render(request, "cart/cart_list.html", {"cart": cart})
 
 
 def session_cart_view(request):
     """Display the cart for session-based users."""
-    cart = request.session.get("cart", {})
-    cart_items = [
-        (get_object_or_404(Book, pk=int(pk)), qty) for pk, qty in cart.items()
-    ]
-    total = sum(book.price * qty for book, qty in cart_items)
+    cart = get_session_cart(request.session)
+    books = Book.objects.in_bulk(list(cart))
+    cart_items = []
+    total = 0
+    for book_id, qty in cart.items():
+        book = books.get(book_id)
+        if book is None:
+            continue  # The book was deleted since it was added
+        cart_items.append((book, qty))
+        total += book.price * qty
+
+    if len(cart_items) != len(cart):
+        save_session_cart(request.session, {book.pk: qty for book, qty in cart_items})
     return render(
         request, "cart/session_cart.html", {"items": cart_items, "total": total}
     )
@@ -84,14 +85,14 @@ def delete_item(request, pk):
         # We query CartItem where cart__user is the request.user
         item = get_object_or_404(CartItem, pk=pk, cart__user=request.user)
         item.delete()
+        invalidate_cart_item_count(request.user.pk)
         messages.success(request, "Item was deleted successfully.")
         return redirect("cart:cart_list")
 
     # (Session logic remains the same)
-    cart = request.session.get("cart", {})
-    pk_str = str(pk)
-    if pk_str in cart:
-        del cart[pk_str]
-        request.session["cart"] = cart
+    cart = get_session_cart(request.session)
+    if pk in cart:
+        del cart[pk]
+        save_session_cart(request.session, cart)
         messages.success(request, "Item was deleted successfully.")
     return redirect("cart:session_cart")
@@ -54,3 +54,29 @@ def create_book(db):
         )
 
     return make_book
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """
+    Start every test with an empty cache, so DRF throttle counters
+    do not leak from one test into the next.
+    """
+    from django.core.cache import cache
+
+    cache.clear()
+
+
+@pytest.fixture
+def memory_broker():
+    """
+    The Celery app, on the in-memory broker from test_settings. Queues that
+    code talks to directly (like the mail outbox) are emptied afterwards.
+    """
+    from bookStore.celery import app
+    from mailer.worker import MAIL_DEAD_LETTER_QUEUE, MAIL_QUEUE
+
+    yield app
+    with app.connection_for_write() as conn:
+        for name in (MAIL_QUEUE, MAIL_DEAD_LETTER_QUEUE):
+            conn.SimpleQueue(name).clear()
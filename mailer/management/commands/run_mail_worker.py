@@ -0,0 +1,71 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from mailer.worker import MailWorker, SMTPConnectionPool
+
+
+class Command(BaseCommand):
+    help = (
+        "Send queued email in batches over a pool of open SMTP connections. "
+        "Runs until stopped unless --until-empty is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--connections",
+            type=int,
+            default=1,
+            help="SMTP connections kept open, one sending thread each (default: 1).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=50,
+            help="Messages taken from the queue per batch (default: 50).",
+        )
+        parser.add_argument(
+            "--wait",
+            type=float,
+            default=1.0,
+            help="Seconds to wait for a message before a batch is empty.",
+        )
+        parser.add_argument(
+            "--until-empty",
+            action="store_true",
+            help="Stop once the queue is empty and print the send rate.",
+        )
+
+    def handle(self, *args, **options):
+        pool = SMTPConnectionPool(size=options["connections"])
+        workers = [
+            MailWorker(pool, batch_size=options["batch_size"], wait=options["wait"])
+            for _ in range(options["connections"])
+        ]
+        threads = [
+            threading.Thread(
+                target=worker.run,
+                kwargs={"until_empty": options["until_empty"]},
+                daemon=True,
+            )
+            for worker in workers
+        ]
+
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                thread.join()
+        finally:
+            pool.close()
+
+        elapsed = time.perf_counter() - started
+        sent = sum(worker.sent for worker in workers)
+        rate = sent / elapsed if elapsed else 0.0
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Sent {sent} messages over {pool.opened} SMTP connections "
+                f"in {elapsed:.1f}s ({rate:.1f} msg/s)."
+            )
+        )
@@ -0,0 +1,225 @@
+import socketserver
+import threading
+from io import StringIO
+
+import pytest
+from django.core import mail
+from django.core.mail import EmailMessage
+from django.core.management import call_command
+from mailer.worker import (
+    MAIL_DEAD_LETTER_QUEUE,
+    MAIL_QUEUE,
+    DeliveryInterrupted,
+    MailWorker,
+    SMTPConnectionPool,
+    message_from_dict,
+    message_to_dict,
+    queue_email,
+)
+
+
+class StandInSMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP to accept mail, with no TLS or auth."""
+
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        sent_here = 0
+        self.reply("220 stand-in ready")
+        for raw in self.rfile:
+            command = raw.decode().strip()
+            verb = command.split(" ", 1)[0].upper()
+            if verb in ("EHLO", "HELO"):
+                self.reply("250 stand-in")
+            elif verb == "RCPT" and any(to in command for to in server.refuse):
+                self.reply("550 no such user")
+            elif verb in ("MAIL", "RCPT", "RSET", "NOOP"):
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 go ahead")
+                for line in self.rfile:
+                    if line == b".\r\n":
+                        break
+                self.reply("250 queued")
+                with server.lock:
+                    server.messages += 1
+                sent_here += 1
+                if sent_here == server.drop_after:
+                    return
+            elif verb == "QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("502 not implemented")
+
+
+class StandInSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StandInSMTPHandler)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.messages = 0
+        # Hang up on the client after this many messages on one connection
+        self.drop_after = None
+        self.refuse = ()
+
+
+@pytest.fixture
+def smtp_server():
+    server = StandInSMTPServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def smtp_pool(smtp_server):
+    pool = SMTPConnectionPool(
+        backend="django.core.mail.backends.smtp.EmailBackend",
+        host="127.0.0.1",
+        port=smtp_server.server_address[1],
+        username="",
+        password="",
+        use_tls=False,
+        timeout=5,
+    )
+    yield pool
+    pool.close()
+
+
+def make_messages(count, to="reader@test.com"):
+    return [
+        EmailMessage(f"Message {i}", "Body", "shop@test.com", [to])
+        for i in range(count)
+    ]
+
+
+def test_message_round_trips_through_dict():
+    message = EmailMessage("Receipt", "Body", "shop@test.com", ["reader@test.com"])
+    message.attach("recipt.pdf", b"%PDF-1.7", "application/pdf")
+
+    restored = message_from_dict(message_to_dict(message))
+
+    assert restored.subject == "Receipt"
+    assert restored.to == ["reader@test.com"]
+    assert restored.attachments == [("recipt.pdf", b"%PDF-1.7", "application/pdf")]
+
+
+def test_pool_sends_batches_over_one_connection(smtp_server, smtp_pool):
+    assert smtp_pool.send_messages(make_messages(5)) == 5
+    assert smtp_pool.send_messages(make_messages(5)) == 5
+
+    assert smtp_server.messages == 10
+    assert smtp_server.connections == 1
+    assert smtp_pool.opened == 1
+
+
+def test_pool_reconnects_when_the_server_hangs_up(smtp_server, smtp_pool):
+    smtp_server.drop_after = 3
+
+    assert smtp_pool.send_messages(make_messages(7)) == 7
+
+    assert smtp_server.messages == 7
+    assert smtp_server.connections == 3
+
+
+def test_pool_skips_refused_recipients(smtp_server, smtp_pool):
+    smtp_server.refuse = ("gone@test.com",)
+    messages = make_messages(2) + make_messages(1, to="gone@test.com")
+
+    assert smtp_pool.send_messages(messages) == 2
+    assert smtp_server.connections == 1
+
+
+def test_pool_reports_progress_when_reconnecting_fails(smtp_server, smtp_pool):
+    smtp_server.drop_after = 2
+    smtp_pool.send_messages(make_messages(1))
+    smtp_server.shutdown()
+    smtp_server.server_close()
+
+    with pytest.raises(DeliveryInterrupted) as interrupted:
+        smtp_pool.send_messages(make_messages(3))
+
+    assert interrupted.value.processed == 1
+
+
+def test_worker_drains_queue_and_reports_rate(memory_broker, smtp_server, smtp_pool):
+    for message in make_messages(12):
+        queue_email(message)
+
+    worker = MailWorker(smtp_pool, batch_size=5, wait=0.01)
+    worker.run(until_empty=True)
+
+    assert worker.sent == 12
+    assert worker.rate > 0
+    assert smtp_server.messages == 12
+    assert smtp_server.connections == 1
+
+
+def test_worker_requeues_unsent_messages(memory_broker, smtp_server, smtp_pool):
+    for message in make_messages(3):
+        queue_email(message)
+    smtp_server.drop_after = 1
+    smtp_pool.send_messages(make_messages(1))
+    smtp_server.shutdown()
+    smtp_server.server_close()
+
+    with pytest.raises(DeliveryInterrupted):
+        MailWorker(smtp_pool, wait=0.01).run(until_empty=True)
+
+    with memory_broker.connection_for_write() as conn:
+        assert conn.SimpleQueue(MAIL_QUEUE).qsize() == 3
+
+
+def test_worker_dead_letters_bad_messages_and_keeps_draining(
+    memory_broker, smtp_server, smtp_pool
+):
+    """Test a malformed payload or address is parked, not fatal to the worker."""
+    queue_email(make_messages(1)[0])
+    with memory_broker.connection_for_write() as conn:
+        with conn.SimpleQueue(MAIL_QUEUE, serializer="json") as mail_queue:
+            mail_queue.put({"subject": "no body or recipients"})
+    for message in make_messages(1, to="broken\nheader@test.com"):
+        queue_email(message)
+    queue_email(make_messages(1)[0])
+
+    worker = MailWorker(smtp_pool, wait=0.01)
+    worker.run(until_empty=True)
+
+    assert worker.sent == 2
+    assert smtp_server.messages == 2
+    with memory_broker.connection_for_write() as conn:
+        assert conn.SimpleQueue(MAIL_QUEUE).qsize() == 0
+        failed_queue = conn.SimpleQueue(MAIL_DEAD_LETTER_QUEUE)
+        failed = [failed_queue.get(timeout=1) for _ in range(2)]
+    assert "KeyError" in failed[0].payload["error"]
+    assert "no body or recipients" in failed[0].payload["body"]
+    assert "header@test.com" in failed[1].payload["body"]
+    assert "Invalid address" in failed[1].payload["error"]
+
+
+def test_run_mail_worker_command(memory_broker, mailoutbox):
+    for message in make_messages(4):
+        queue_email(message)
+    out = StringIO()
+
+    call_command(
+        "run_mail_worker",
+        "--until-empty",
+        "--connections=2",
+        "--wait=0.01",
+        stdout=out,
+    )
+
+    assert len(mail.outbox) == 4
+    assert "Sent 4 messages over" in out.getvalue()
+    assert "msg/s" in out.getvalue()
@@ -0,0 +1,303 @@
+"""
+Batched mail sending over pooled SMTP connections.
+
+queue_email() puts a message on the broker instead of sending it. The
+run_mail_worker command drains that queue in batches and sends them over
+SMTP connections that stay open between batches, so the connect, EHLO,
+STARTTLS and login handshake is paid once per connection instead of once
+per message. A dropped connection is reopened and the message resent; a
+message that can never be sent is moved to a dead-letter queue.
+"""
+
+import base64
+import logging
+import queue
+import time
+from contextlib import contextmanager
+from smtplib import (
+    SMTPDataError,
+    SMTPException,
+    SMTPRecipientsRefused,
+    SMTPSenderRefused,
+)
+
+from celery import current_app
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+
+logger = logging.getLogger(__name__)
+
+MAIL_QUEUE = "mail_outbox"
+# Messages that can never be sent, kept with the error for a person to look at
+MAIL_DEAD_LETTER_QUEUE = "mail_outbox_failed"
+
+# The server rejected this message; resending it will not help
+MESSAGE_ERRORS = (SMTPRecipientsRefused, SMTPSenderRefused, SMTPDataError)
+# The connection is broken; reopen it and try the message again
+CONNECTION_ERRORS = (SMTPException, OSError)
+
+
+def message_to_dict(message):
+    """Turn an EmailMessage into something the JSON serializer can carry."""
+    attachments = []
+    for filename, content, mimetype in message.attachments:
+        if isinstance(content, str):
+            content = content.encode()
+        attachments.append([filename, base64.b64encode(content).decode(), mimetype])
+    return {
+        "subject": message.subject,
+        "body": message.body,
+        "from_email": message.from_email,
+        "to": message.to,
+        "cc": message.cc,
+        "bcc": message.bcc,
+        "reply_to": message.reply_to,
+        "headers": message.extra_headers,
+        "attachments": attachments,
+    }
+
+
+def message_from_dict(data, connection=None):
+    attachments = [
+        (filename, base64.b64decode(content), mimetype)
+        for filename, content, mimetype in data["attachments"]
+    ]
+    return EmailMessage(
+        subject=data["subject"],
+        body=data["body"],
+        from_email=data["from_email"],
+        to=data["to"],
+        cc=data["cc"],
+        bcc=data["bcc"],
+        reply_to=data["reply_to"],
+        headers=data["headers"],
+        attachments=attachments,
+        connection=connection,
+    )
+
+
+def queue_email(message):
+    """Hand message to the mail worker instead of sending it here."""
+    with current_app.connection_for_write() as conn:
+        with conn.SimpleQueue(MAIL_QUEUE, serializer="json") as mail_queue:
+            mail_queue.put(message_to_dict(message))
+
+
+class DeliveryInterrupted(Exception):
+    """Sending stopped partway; `processed` messages were already handled."""
+
+    def __init__(self, processed, error):
+        super().__init__(f"Delivery stopped after {processed} messages: {error}")
+        self.processed = processed
+        self.error = error
+
+
+class SMTPConnectionPool:
+    """
+    Up to `size` open connections from the mail backend, shared between
+    threads. A connection goes back to the pool after use and is only
+    closed by close() or when it breaks.
+    """
+
+    def __init__(self, size=1, backend=None, **backend_kwargs):
+        self.size = size
+        self.backend = backend or settings.EMAIL_BACKEND
+        self.backend_kwargs = backend_kwargs
+        self._idle = queue.LifoQueue()
+        self._slots = queue.Queue()
+        for _ in range(size):
+            self._slots.put(None)
+        self.opened = 0
+
+    def _open(self):
+        connection = get_connection(
+            self.backend, fail_silently=False, **self.backend_kwargs
+        )
+        connection.open()
+        self.opened += 1
+        return connection
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection, opening one if none is idle."""
+        self._slots.get()
+        try:
+            connection = self._idle.get_nowait()
+        except queue.Empty:
+            connection = None
+        try:
+            if connection is None:
+                connection = self._open()
+            yield connection
+        except BaseException:
+            if connection is not None:
+                connection.close()
+                connection = None
+            raise
+        finally:
+            if connection is not None:
+                self._idle.put(connection)
+            self._slots.put(None)
+
+    def send_messages(self, messages, on_error=None):
+        """
+        Send messages over one pooled connection and return how many were
+        accepted. A message that cannot be sent (refused by the server, or
+        broken itself, like a malformed address) is logged, passed to
+        on_error(index, error) and skipped. If the connection breaks it is
+        reopened once for the message that failed; if that fails too,
+        DeliveryInterrupted says how far we got.
+        """
+        sent = 0
+        with self.connection() as connection:
+            for processed, message in enumerate(messages):
+                try:
+                    error = self._send(connection, message)
+                except CONNECTION_ERRORS as lost:
+                    logger.info("SMTP connection lost (%s), reconnecting", lost)
+                    connection.close()
+                    try:
+                        connection.open()
+                        self.opened += 1
+                        error = self._send(connection, message)
+                    except CONNECTION_ERRORS as lost:
+                        raise DeliveryInterrupted(processed, lost) from lost
+                if error is None:
+                    sent += 1
+                    continue
+                logger.warning("Dropping message to %s: %r", message.to, error)
+                if on_error is not None:
+                    on_error(processed, error)
+        return sent
+
+    @staticmethod
+    def _send(connection, message):
+        """
+        Send one message. Return the error that rules this message out, or
+        None once it is sent; connection errors are raised.
+        """
+        try:
+            connection.send_messages([message])
+        except MESSAGE_ERRORS as error:
+            return error
+        except CONNECTION_ERRORS:
+            raise
+        except Exception as error:
+            return error
+        return None
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class MailWorker:
+    """Drain the mail queue in batches through a connection pool."""
+
+    def __init__(self, pool, batch_size=50, wait=1.0):
+        self.pool = pool
+        self.batch_size = batch_size
+        self.wait = wait
+        self.sent = 0
+        self.elapsed = 0.0
+
+    @property
+    def rate(self):
+        """Messages sent per second of sending time."""
+        return self.sent / self.elapsed if self.elapsed else 0.0
+
+    def _take_batch(self, mail_queue):
+        batch = []
+        try:
+            batch.append(mail_queue.get(timeout=self.wait))
+            while len(batch) < self.batch_size:
+                batch.append(mail_queue.get(block=False))
+        except mail_queue.Empty:
+            pass
+        return batch
+
+    @staticmethod
+    def _dead_letter(item, error, failed_queue):
+        """Park a message that can never be sent, then ack it off the queue."""
+        logger.error(
+            "Moving undeliverable mail to %s: %r", MAIL_DEAD_LETTER_QUEUE, error
+        )
+        if failed_queue is not None:
+            body = item.body
+            if isinstance(body, bytes):
+                body = body.decode(errors="replace")
+            failed_queue.put({"body": body, "error": repr(error)})
+        item.ack()
+
+    def drain_once(self, mail_queue, failed_queue=None):
+        """
+        Send one batch from mail_queue; returns the number of messages taken.
+        Messages that cannot be decoded or sent go to failed_queue, so one
+        bad message never stops the queue from draining.
+        """
+        batch = self._take_batch(mail_queue)
+        if not batch:
+            return 0
+
+        items, messages = [], []
+        for item in batch:
+            try:
+                messages.append(message_from_dict(item.payload))
+            except Exception as error:
+                self._dead_letter(item, error, failed_queue)
+            else:
+                items.append(item)
+
+        def undeliverable(index, error):
+            self._dead_letter(items[index], error, failed_queue)
+
+        started = time.perf_counter()
+        try:
+            self.sent += self.pool.send_messages(messages, on_error=undeliverable)
+        except DeliveryInterrupted as interrupted:
+            for item in items[: interrupted.processed]:
+                if not item.acknowledged:
+                    item.ack()
+            for item in items[interrupted.processed :]:
+                item.requeue()
+            raise
+        except Exception:
+            # e.g. no connection could be opened at all
+            for item in items:
+                if not item.acknowledged:
+                    item.requeue()
+            raise
+        finally:
+            self.elapsed += time.perf_counter() - started
+        for item in items:
+            if not item.acknowledged:
+                item.ack()
+        return len(batch)
+
+    def run(self, until_empty=False):
+        """Send batches until stopped, or until the queue is empty."""
+        with current_app.connection_for_write() as conn:
+            mail_queue = conn.SimpleQueue(MAIL_QUEUE, serializer="json")
+            failed_queue = conn.SimpleQueue(MAIL_DEAD_LETTER_QUEUE, serializer="json")
+            with mail_queue, failed_queue:
+                while True:
+                    try:
+                        taken = self.drain_once(mail_queue, failed_queue)
+                    except Exception:
+                        if until_empty:
+                            raise
+                        # Unsent messages were requeued; give the server a moment
+                        logger.exception("Mail delivery interrupted")
+                        time.sleep(self.wait)
+                        continue
+                    if taken:
+                        logger.info(
+                            "Sent %d messages so far (%.1f msg/s)",
+                            self.sent,
+                            self.rate,
+                        )
+                    elif until_empty:
+                        return
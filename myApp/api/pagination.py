@@ -0,0 +1,77 @@
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from myApp.pagination import InvalidCursor, KeysetPaginator
+from myApp.search import get_catalog_ordering
+
+
+class BookCursorPagination(BasePagination):
+    """
+    Keyset pagination for the books API. `?ordering=` picks one of
+    BOOK_ORDERING_FIELDS (prefix "-" for descending), search results default
+    to relevance, and `?cursor=` comes from the `next`/`previous` links of
+    the previous response.
+    """
+
+    page_size = 20
+    cursor_query_param = "cursor"
+    ordering_query_param = "ordering"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        ordering = get_catalog_ordering(
+            request.query_params.get(self.ordering_query_param), queryset
+        )
+        paginator = KeysetPaginator(queryset, ordering, self.page_size)
+        try:
+            self.page = paginator.page(
+                request.query_params.get(self.cursor_query_param)
+            )
+        except InvalidCursor as e:
+            raise NotFound(str(e))
+        return self.page.object_list
+
+    def get_link(self, cursor):
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": self.get_link(self.page.next_cursor),
+                "previous": self.get_link(self.page.previous_cursor),
+                "results": data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "The pagination cursor value.",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.ordering_query_param,
+                "required": False,
+                "in": "query",
+                "description": "One of price, title or author; prefix - to reverse.",
+                "schema": {"type": "string"},
+            },
+        ]
@@ -27,12 +27,15 @@ class BookSerializer(serializers.ModelSerializer):
         )
 
     def get_average_rate(self, obj):
-        return obj.get_average_rating()
+        return obj.rating_avg
 
     def get_rate_numbers(self, obj):
-        return obj.get_rates_number()
+        return obj.rating_count
 
     def get_is_favorite(self, obj):
+        # Querysets from BookViewset come annotated; others fall back to a query
+        if hasattr(obj, "is_favorite"):
+            return obj.is_favorite
         user = self.context.get("request").user
         if user.is_authenticated:
             return obj.book_favorites.filter(user=user).exists()
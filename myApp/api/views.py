@@ -1,27 +1,61 @@
+import hashlib
+
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from rest_framework import viewsets
+from myApp.cache_versions import get_catalog_versions
 from myApp.models import Book
+from myApp.search import search_books
 from .serializers import BookSerializer
 from .permissions import IsAdminOrReadOnly
+from .pagination import BookCursorPagination
+
+
+def book_etag(request, pk=None, **kwargs):
+    """
+    A strong ETag for a book list or detail response, built from cache
+    version counters only, so a matching If-None-Match costs no query.
+    The URL and its query string are the client's cache key already; the
+    renderer is included because one URL serves both JSON and HTML.
+    """
+    user_id = request.user.pk if request.user.is_authenticated else None
+    versions = get_catalog_versions(book_id=pk, user_id=user_id)
+    parts = [request.accepted_renderer.format, pk, user_id, *versions]
+    return hashlib.sha256("|".join(map(str, parts)).encode()).hexdigest()
 
 
 class BookViewset(viewsets.ModelViewSet):
     """
     A viewset with search and ordering.
+    `?q=` runs a ranked full-text search over title, author and description.
+    Ordering is applied by the keyset pagination class.
+    GET requests carry an ETag and a matching If-None-Match gets a 304
+    before any query or serializer runs.
     """
 
     serializer_class = BookSerializer
     permission_classes = (IsAdminOrReadOnly,)
+    pagination_class = BookCursorPagination
 
     def get_queryset(self):
         title = self.request.query_params.get("title")
+        query = self.request.query_params.get("q")
         qs = Book.objects.all()
         if title:
             qs = qs.filter(title__icontains=title)
+        if query:
+            qs = search_books(qs, query)
+        # Serializer fields read this and the stored rating columns, so a
+        # list page is a single query however many books it holds
+        return qs.with_is_favorite(self.request.user)
+
+    @method_decorator(condition(etag_func=book_etag))
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
 
-        ordering = self.request.query_params.get("ordering")
-        if ordering:
-            qs = qs.order_by(ordering)
-        return qs
+    @method_decorator(condition(etag_func=book_etag))
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
 
 
 # TODO: We can also do the filtering part with DRF built-in
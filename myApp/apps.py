@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class MyappConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "myApp"
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+        from . import signals
+
+        # The search index is raw, database-specific SQL, so it is installed
+        # after the regular tables exist
+        post_migrate.connect(signals.create_search_index, sender=self)
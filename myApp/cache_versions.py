@@ -0,0 +1,90 @@
+"""
+Version counters for cached book data.
+
+Each book has a counter in the cache; the card fragment is cached under the
+current value, so bumping it makes the next render miss and rebuild. Old
+fragments are never deleted, they just stop being asked for and expire.
+
+The counter is read after the page's rows, so a request can read a row just
+before a write commits and the counter just after its bump, and cache the
+old card under the new version. The card key therefore also holds the stock,
+price and rating, which every purchase and rating changes, and cards expire
+after BOOK_CARD_TIMEOUT to bound how long a stale title or image can last.
+
+The catalog counter moves whenever any book does, and each user has a counter
+for their favorites. The books API builds its ETags from these, so a
+conditional request is answered from the cache without touching the database.
+"""
+
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+CATALOG_VERSION_KEY = "catalog-version"
+BOOK_CARD_TIMEOUT = 60 * 60
+
+
+def _version_key(book_id):
+    return f"book-card-version:{book_id}"
+
+
+def _favorites_version_key(user_id):
+    return f"favorites-version:{user_id}"
+
+
+def _fresh_version():
+    # A counter lost to eviction restarts from the clock rather than from 1,
+    # so it can never land on a version an old fragment was stored under
+    return time.time_ns()
+
+
+def _get_versions(keys):
+    """Return {key: version}, starting any missing counter from the clock."""
+    versions = cache.get_many(keys)
+    missing = {key: _fresh_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        versions.update(missing)
+    return versions
+
+
+def _bump(keys):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _fresh_version(), timeout=None)
+
+
+def get_book_card_versions(book_ids):
+    """Return {book_id: version} for all book_ids with one cache round trip."""
+    keys = {_version_key(book_id): book_id for book_id in book_ids}
+    return {keys[key]: value for key, value in _get_versions(list(keys)).items()}
+
+
+def get_catalog_versions(book_id=None, user_id=None):
+    """
+    Return the versions an API response depends on, in one cache round trip:
+    the whole catalog, or a single book, plus the user's favorites if any.
+    """
+    keys = [CATALOG_VERSION_KEY if book_id is None else _version_key(book_id)]
+    if user_id is not None:
+        keys.append(_favorites_version_key(user_id))
+    versions = _get_versions(keys)
+    return [versions[key] for key in keys]
+
+
+def bump_book_card_versions(*book_ids):
+    """
+    Invalidate the cached cards of book_ids once the current transaction
+    commits, so the next render reads the committed rows.
+    """
+    keys = [_version_key(book_id) for book_id in book_ids]
+    keys.append(CATALOG_VERSION_KEY)
+    transaction.on_commit(lambda: _bump(keys))
+
+
+def bump_favorites_version(user_id):
+    """Invalidate anything derived from user_id's favorites after commit."""
+    transaction.on_commit(lambda: _bump([_favorites_version_key(user_id)]))
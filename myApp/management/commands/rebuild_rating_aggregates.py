@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from myApp.models import Book
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored rating sum, count and average of every book."
+
+    def handle(self, *args, **options):
+        updated = Book.objects.rebuild_rating_aggregates()
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt rating aggregates for {updated} books.")
+        )
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from myApp.recommend import train_model
+
+
+class Command(BaseCommand):
+    help = "Train the recommendation model and publish it as the latest version."
+
+    def handle(self, *args, **options):
+        version = train_model()
+        if version is None:
+            self.stdout.write(self.style.WARNING("No ratings to train on."))
+            return
+        self.stdout.write(self.style.SUCCESS(f"Trained model version {version}."))
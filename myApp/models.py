@@ -1,9 +1,23 @@
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models import (
+    Avg,
+    Count,
+    Exists,
+    F,
+    FloatField,
+    OuterRef,
+    Subquery,
+    Sum,
+    Value,
+)
+from django.db.models.functions import Cast, Coalesce, NullIf, Round
+from django.db.models.lookups import IsNull
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.urls import reverse
 from django.conf import settings
 from decimal import Decimal
 from django.utils.text import slugify
+from typing import NamedTuple
 import os
 
 
@@ -12,6 +26,101 @@ def book_image_upload_path(instance, filename):
     return os.path.join("uploads", title_slug, filename)
 
 
+class StockLevel(NamedTuple):
+    stock: int
+    # How much of the requested quantity was not in stock
+    shortfall: int
+
+
+# Orderings the catalog can be paginated on; each has an (field, id) index
+BOOK_ORDERING_FIELDS = ("price", "title", "author")
+
+
+class BookQuerySet(models.QuerySet):
+    def with_is_favorite(self, user):
+        """Annotate is_favorite for user with one EXISTS subquery per row."""
+        if not user.is_authenticated:
+            return self.annotate(is_favorite=Value(False))
+        return self.annotate(
+            is_favorite=Exists(Favorite.objects.filter(user=user, book=OuterRef("pk")))
+        )
+
+    def apply_rating_delta(self, rate_delta, count_delta):
+        """
+        Shift the stored rating aggregates in a single UPDATE so concurrent
+        ratings never overwrite each other.
+        """
+        new_sum = F("rating_sum") + Value(Decimal(str(rate_delta)))
+        new_count = F("rating_count") + count_delta
+        return self.update(
+            rating_sum=new_sum,
+            rating_count=new_count,
+            rating_avg=Coalesce(
+                Round(Cast(new_sum, FloatField()) / NullIf(new_count, 0), 1),
+                Value(0.0),
+            ),
+        )
+
+    def rebuild_rating_aggregates(self):
+        """Recompute the stored rating aggregates from the Rating table."""
+        ratings = Rating.objects.filter(book=OuterRef("pk")).values("book")
+        return self.update(
+            rating_sum=Coalesce(
+                Subquery(ratings.annotate(total=Sum("rate")).values("total")),
+                Value(Decimal("0.0")),
+            ),
+            rating_count=Coalesce(
+                Subquery(ratings.annotate(total=Count("pk")).values("total")), 0
+            ),
+            rating_avg=Coalesce(
+                Subquery(
+                    ratings.annotate(average=Round(Avg("rate"), 1)).values("average")
+                ),
+                Value(Decimal("0.0")),
+            ),
+        )
+
+    def decrement_stock(self, quantities):
+        """
+        Take {book_id: quantity} out of stock in one UPDATE and return
+        {book_id: StockLevel}. Stock never goes below zero: a paid order is
+        not refused because another one got there first, and the quantity
+        it could not take is reported as the shortfall.
+
+        Rows are locked in primary key order first, so two orders sharing
+        books always wait on each other in the same order and cannot deadlock.
+        """
+        if not quantities:
+            return {}
+        book_ids = sorted(quantities)
+        connection = connections[self.db]
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        whens = " ".join(["WHEN %s THEN %s"] * len(book_ids))
+        taken = f"(CASE id {whens} END)"
+        taken_params = []
+        for book_id in book_ids:
+            taken_params += [book_id, quantities[book_id]]
+        sql = (
+            f"UPDATE {table} SET stock = "
+            f"CASE WHEN stock > {taken} THEN stock - {taken} ELSE 0 END "
+            f"WHERE id IN ({', '.join(['%s'] * len(book_ids))}) "
+            "RETURNING id, stock"
+        )
+        params = taken_params * 2 + book_ids
+
+        with transaction.atomic(using=self.db):
+            locked = self.filter(pk__in=book_ids).order_by("pk").select_for_update()
+            before = dict(locked.values_list("pk", "stock"))
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                return {
+                    book_id: StockLevel(
+                        stock, max(quantities[book_id] - before[book_id], 0)
+                    )
+                    for book_id, stock in cursor.fetchall()
+                }
+
+
 class Book(models.Model):
     title = models.CharField(max_length=264)
     author = models.CharField(max_length=264)
@@ -21,6 +130,24 @@ class Book(models.Model):
     stock = models.IntegerField(validators=[MinValueValidator(0)], default=0)
     image = models.ImageField(upload_to=book_image_upload_path, blank=True)
     description = models.CharField(max_length=264, null=True, blank=True)
+    # Denormalized rating aggregates, kept in sync by myApp.signals
+    rating_sum = models.DecimalField(
+        max_digits=10, decimal_places=1, default=0, editable=False
+    )
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_avg = models.DecimalField(
+        max_digits=2, decimal_places=1, default=0, editable=False
+    )
+
+    objects = BookQuerySet.as_manager()
+
+    class Meta:
+        # Composite indexes for keyset pagination on each supported ordering
+        indexes = [
+            models.Index(fields=["price", "id"], name="book_price_id_idx"),
+            models.Index(fields=["title", "id"], name="book_title_id_idx"),
+            models.Index(fields=["author", "id"], name="book_author_id_idx"),
+        ]
 
     def get_absolute_url(self):
         return reverse("myApp:home")
@@ -31,15 +158,10 @@ class Book(models.Model):
         return False
 
     def get_average_rating(self):
-        ratings = self.book_ratings.all()
-        if not ratings:
-            return Decimal("0.0")
-        else:
-            total = sum(rating.rate for rating in ratings)
-        return Decimal(round(total / len(ratings), 1))
+        return Decimal(self.rating_avg)
 
     def get_rates_number(self):
-        return len(self.book_ratings.all())
+        return self.rating_count
 
     def quantity_stock_check(self, quantity):
         if quantity > self.stock:
@@ -88,5 +210,45 @@ class Rating(models.Model):
             )
         ]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored rate so an update can apply the difference
+        instance._loaded_rate = dict(zip(field_names, values)).get("rate")
+        return instance
+
     def __str__(self):
         return f"{self.user.email} rated {self.rate} to {self.book.title}"
+
+
+class UserRecommendation(models.Model):
+    """
+    Precomputed top-N book ids per user, refreshed by a Celery beat job.
+    The single row without a user holds the popularity fallback list.
+    """
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="recommendation",
+    )
+    book_ids = models.JSONField(default=list)
+    model_version = models.CharField(max_length=32)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            # NULLs never clash in a unique index, so the single fallback row
+            # gets its own partial index
+            models.UniqueConstraint(
+                IsNull(models.F("user"), True),
+                condition=models.Q(user__isnull=True),
+                name="unique_popular_recommendation",
+            )
+        ]
+
+    def __str__(self):
+        owner = self.user.email if self.user_id else "popular"
+        return f"Recommendations for {owner} ({self.model_version})"
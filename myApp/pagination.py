@@ -0,0 +1,134 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def clean_ordering(ordering, allowed_fields, default="id"):
+    """Return ordering if it names an allowed field (optionally with "-")."""
+    if ordering and ordering.lstrip("-") in allowed_fields:
+        return ordering
+    return default
+
+
+class KeysetPage:
+    """One page of results plus the cursors pointing at its neighbours."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """
+    Paginate on an (ordering key, id) pair instead of OFFSET.
+
+    The cursor remembers the key and id of the edge row, and the next page is
+    "rows after that pair". The database seeks straight to it through the
+    matching composite index, so page 1000 costs the same as page 1.
+    """
+
+    def __init__(self, queryset, ordering="id", page_size=20):
+        self.queryset = queryset
+        self.descending = ordering.startswith("-")
+        self.field = ordering.lstrip("-")
+        self.page_size = page_size
+
+    @staticmethod
+    def encode_cursor(value, pk, reverse):
+        data = json.dumps([str(value), pk, reverse]).encode()
+        return base64.urlsafe_b64encode(data).decode()
+
+    @staticmethod
+    def decode_cursor(cursor):
+        try:
+            value, pk, reverse = json.loads(base64.urlsafe_b64decode(cursor))
+            return value, int(pk), bool(reverse)
+        except (TypeError, ValueError):
+            raise InvalidCursor("Invalid cursor.")
+
+    def _to_python(self, value):
+        """Convert a cursor's key back to the type of the ordering field."""
+        annotation = self.queryset.query.annotations.get(self.field)
+        if annotation is not None:
+            field = annotation.output_field
+        else:
+            field = self.queryset.model._meta.get_field(self.field)
+        try:
+            return field.to_python(value)
+        except ValidationError:
+            raise InvalidCursor("Invalid cursor.")
+
+    def _cursor_for(self, obj, reverse):
+        return self.encode_cursor(getattr(obj, self.field), obj.pk, reverse)
+
+    def _seek(self, queryset, value, pk, forward):
+        """Keep only the rows that come after (value, pk) in scan order."""
+        gt = "gt" if forward else "lt"
+        if self.field in ("id", "pk"):
+            return queryset.filter(**{f"pk__{gt}": pk})
+        value = self._to_python(value)
+        # The redundant `gte`/`lte` bound lets the database use the index
+        # for a range scan instead of evaluating the OR on every row.
+        return queryset.filter(
+            Q(**{f"{self.field}__{gt}e": value}),
+            Q(**{f"{self.field}__{gt}": value})
+            | Q(**{self.field: value, f"pk__{gt}": pk}),
+        )
+
+    def page(self, cursor=None):
+        reverse = False
+        queryset = self.queryset
+        if cursor:
+            value, pk, reverse = self.decode_cursor(cursor)
+            forward = self.descending == reverse
+            queryset = self._seek(queryset, value, pk, forward)
+
+        descending = self.descending != reverse
+        prefix = "-" if descending else ""
+        order = [f"{prefix}pk"]
+        if self.field not in ("id", "pk"):
+            order.insert(0, f"{prefix}{self.field}")
+
+        rows = list(queryset.order_by(*order)[: self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[: self.page_size]
+        if reverse:
+            rows.reverse()
+        if not rows:
+            return KeysetPage(rows)
+
+        if reverse:
+            next_cursor = self._cursor_for(rows[-1], reverse=False)
+            previous_cursor = (
+                self._cursor_for(rows[0], reverse=True) if has_more else None
+            )
+        else:
+            next_cursor = (
+                self._cursor_for(rows[-1], reverse=False) if has_more else None
+            )
+            previous_cursor = (
+                self._cursor_for(rows[0], reverse=True) if cursor else None
+            )
+        return KeysetPage(rows, next_cursor, previous_cursor)
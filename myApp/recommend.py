@@ -1,9 +1,65 @@
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
 import pandas as pd
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
 from surprise import Dataset, Reader, SVD
-from myApp.models import Rating
+from myApp.models import Book, Rating, UserRecommendation
+from myApp.scoring import FactorScorer
 
+CURRENT_LINK = "current"
+VERSIONS_DIR = "versions"
+KEEP_VERSIONS = 3
+POPULARITY_VERSION = "popularity"
 
-def get_top_n_recommendations(user_id, n=5):
+# Per-process cache of the mapped scorer, so each worker opens it only once
+_loaded_artifact = {"path": None, "scorer": None}
+
+
+def get_model_dir():
+    return Path(settings.RECOMMENDER_MODEL_DIR)
+
+
+def publish_version(scorer, version):
+    """
+    Write the scorer's arrays into versions/<version>/ and atomically swap
+    the `current` symlink to it. Readers only ever follow `current`, so
+    they see either the old complete version or the new complete one.
+    """
+    versions_dir = get_model_dir() / VERSIONS_DIR
+    versions_dir.mkdir(parents=True, exist_ok=True)
+
+    # Build the whole version under a temp name, then rename it into place
+    tmp_dir = Path(tempfile.mkdtemp(dir=versions_dir, prefix=".tmp-"))
+    try:
+        scorer.save(tmp_dir)
+        os.rename(tmp_dir, versions_dir / version)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    tmp_link = get_model_dir() / f".{CURRENT_LINK}-{version}"
+    os.symlink(Path(VERSIONS_DIR) / version, tmp_link)
+    os.replace(tmp_link, get_model_dir() / CURRENT_LINK)
+
+    # Workers still mapping a pruned version keep their pages until reload
+    old_versions = sorted(
+        path for path in versions_dir.iterdir() if not path.name.startswith(".")
+    )
+    for path in old_versions[:-KEEP_VERSIONS]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def train_model():
+    """
+    Fit the SVD model on every rating and write it as a new versioned
+    artifact. Returns the version, or None if there is nothing to train on.
+    This is the offline half; request handling never calls it.
+    """
     # 1. Fetch data from Django model
     ratings_qs = Rating.objects.all().values("user_id", "book_id", "rate")
     ratings_df = pd.DataFrame.from_records(ratings_qs)
@@ -11,7 +67,7 @@ def get_top_n_recommendations(user_id, n=5):
     # 2. Check if DataFrame is valid
     required_columns = {"user_id", "book_id", "rate"}
     if ratings_df.empty or not required_columns.issubset(set(ratings_df.columns)):
-        return []
+        return None
 
     # 3. Define the data format for Surprise
     reader = Reader(rating_scale=(1, 5))
@@ -22,20 +78,119 @@ def get_top_n_recommendations(user_id, n=5):
     model = SVD()
     model.fit(trainset)
 
-    # 5. Get all book IDs
-    all_book_ids = ratings_df["book_id"].unique()
+    # 5. Persist the factor matrices and make them the current version
+    version = timezone.now().strftime("%Y%m%d%H%M%S%f")
+    publish_version(FactorScorer.from_svd(model), version)
+    return version
+
+
+def load_model():
+    """
+    Return a FactorScorer for the current version, or None if no model has
+    been trained. The .npy files are memory-mapped read-only, so every
+    worker shares one page-cache copy. A new version is picked up as soon
+    as the `current` symlink points somewhere else.
+    """
+    try:
+        target = os.readlink(get_model_dir() / CURRENT_LINK)
+    except FileNotFoundError:
+        return None
+
+    path = get_model_dir() / target
+    if _loaded_artifact["path"] != path:
+        scorer = FactorScorer.load(path, mmap_mode="r")
+        scorer.version = path.name
+        _loaded_artifact["scorer"] = scorer
+        _loaded_artifact["path"] = path
+    return _loaded_artifact["scorer"]
+
+
+def get_recommendations_for_users(user_ids, n=5):
+    """
+    Return {user_id: [book ids]} for a batch of users, scored with a single
+    matrix multiply. Books a user has already rated are never recommended.
+    """
+    scorer = load_model()
+    if scorer is None:
+        return {user_id: [] for user_id in user_ids}
+
+    rated = {}
+    for user_id, book_id in Rating.objects.filter(user_id__in=user_ids).values_list(
+        "user_id", "book_id"
+    ):
+        rated.setdefault(user_id, []).append(book_id)
+
+    top = scorer.top_n_batch(list(user_ids), n=n, exclude=rated)
+    return dict(zip(user_ids, top))
+
+
+def get_top_n_recommendations(user_id, n=5):
+    return get_recommendations_for_users([user_id], n=n)[user_id]
+
+
+def refresh_popular_books(n=5):
+    """Store the fallback list used for users without their own row."""
+    book_ids = list(
+        Book.objects.order_by("-rating_count", "-rating_avg", "id").values_list(
+            "id", flat=True
+        )[:n]
+    )
+    # Locks the fallback row; the unique_popular_recommendation constraint
+    # makes a concurrent first insert fail over to updating the winner's row
+    UserRecommendation.objects.update_or_create(
+        user=None,
+        defaults={"book_ids": book_ids, "model_version": POPULARITY_VERSION},
+    )
+    return book_ids
+
+
+def refresh_user_recommendations(n=5, chunk_size=None):
+    """
+    Recompute and store the top n books of every user the model knows,
+    scoring chunk_size users per matrix multiply and writing each chunk
+    with one bulk upsert. Returns the number of users refreshed.
 
-    # 6. Get books this user already rated
-    rated_books = ratings_df[ratings_df["user_id"] == user_id]["book_id"].tolist()
+    By default the chunk is as many users as the scorer fits in its memory
+    budget, so a larger catalog means smaller chunks.
+    """
+    refresh_popular_books(n=n)
+    scorer = load_model()
+    if scorer is None:
+        return 0
 
-    # 7. Filter out already rated books
-    books_to_predict = [bid for bid in all_book_ids if bid not in rated_books]
+    chunk_size = chunk_size or scorer.batch_size()
+    user_ids = [int(user_id) for user_id in scorer.user_ids]
+    for start in range(0, len(user_ids), chunk_size):
+        chunk = user_ids[start : start + chunk_size]
+        recommendations = get_recommendations_for_users(chunk, n=n)
+        UserRecommendation.objects.bulk_create(
+            [
+                UserRecommendation(
+                    user_id=user_id,
+                    book_ids=book_ids,
+                    model_version=scorer.version,
+                )
+                for user_id, book_ids in recommendations.items()
+            ],
+            update_conflicts=True,
+            unique_fields=["user"],
+            update_fields=["book_ids", "model_version", "updated_at"],
+        )
 
-    # 8. Predict ratings for the unseen books
-    predictions = [model.predict(user_id, bid) for bid in books_to_predict]
+    # Users dropped from the model fall back to the popularity list
+    UserRecommendation.objects.filter(user__isnull=False).exclude(
+        model_version=scorer.version
+    ).delete()
+    return len(user_ids)
 
-    # 9. Sort and return top n recommendations
-    top_predictions = sorted(predictions, key=lambda x: x.est, reverse=True)[:n]
-    top_book_ids = [int(pred.iid) for pred in top_predictions]
 
-    return top_book_ids
+def get_stored_recommendations(user):
+    """
+    Return the stored book ids for user, or the popularity list when the
+    user has no row yet. This is a single indexed read and never scores.
+    """
+    rows = UserRecommendation.objects.filter(
+        models.Q(user=user) | models.Q(user__isnull=True)
+    ).values_list("user_id", "book_ids")
+    stored = dict(rows)
+    return stored.get(user.pk, stored.get(None, []))
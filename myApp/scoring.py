@@ -0,0 +1,166 @@
+from pathlib import Path
+
+import numpy as np
+
+# Scoring a batch holds a float64 score and an int64 partition index per
+# (user, book) cell; this caps those matrices at about 64 MiB per batch
+SCORE_MEMORY_BUDGET = 64 * 1024 * 1024
+SCORE_BYTES_PER_CELL = 16
+
+
+class FactorScorer:
+    """
+    Scores books straight from the SVD factor matrices, so ranking the whole
+    catalog is one matrix product instead of one model.predict() per book.
+
+    Users and items are stored sorted by their raw id, which lets ids be
+    mapped to rows with np.searchsorted for whole batches at once.
+    """
+
+    ARRAY_NAMES = (
+        "user_ids",
+        "item_ids",
+        "user_factors",
+        "item_factors",
+        "user_biases",
+        "item_biases",
+        "global_mean",
+    )
+
+    def __init__(
+        self,
+        user_ids,
+        item_ids,
+        user_factors,
+        item_factors,
+        user_biases,
+        item_biases,
+        global_mean,
+    ):
+        self.user_ids = user_ids
+        self.item_ids = item_ids
+        self.user_factors = user_factors
+        self.item_factors = item_factors
+        self.user_biases = user_biases
+        self.item_biases = item_biases
+        self.global_mean = float(global_mean)
+
+    @classmethod
+    def from_svd(cls, model):
+        """Export the factors and biases of a fitted surprise SVD model."""
+        trainset = model.trainset
+        user_ids = np.array(
+            [trainset.to_raw_uid(u) for u in trainset.all_users()], dtype=np.int64
+        )
+        item_ids = np.array(
+            [trainset.to_raw_iid(i) for i in trainset.all_items()], dtype=np.int64
+        )
+        user_order = np.argsort(user_ids)
+        item_order = np.argsort(item_ids)
+        return cls(
+            user_ids=user_ids[user_order],
+            item_ids=item_ids[item_order],
+            user_factors=model.pu[user_order],
+            item_factors=model.qi[item_order],
+            user_biases=model.bu[user_order],
+            item_biases=model.bi[item_order],
+            global_mean=trainset.global_mean,
+        )
+
+    def to_arrays(self):
+        return {name: np.asarray(getattr(self, name)) for name in self.ARRAY_NAMES}
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(**{name: arrays[name] for name in cls.ARRAY_NAMES})
+
+    def save(self, directory):
+        """Write every array as <name>.npy so it can be memory-mapped later."""
+        for name, array in self.to_arrays().items():
+            np.save(Path(directory) / f"{name}.npy", array)
+
+    @classmethod
+    def load(cls, directory, mmap_mode=None):
+        """
+        Open the arrays written by save(). With mmap_mode="r" nothing is read
+        into the heap; pages come from the shared OS page cache on demand.
+        """
+        return cls.from_arrays(
+            {
+                name: np.load(Path(directory) / f"{name}.npy", mmap_mode=mmap_mode)
+                for name in cls.ARRAY_NAMES
+            }
+        )
+
+    def _lookup(self, ids, raw_ids):
+        """Return the row of each raw id and a mask of the ids that were found."""
+        raw_ids = np.asarray(raw_ids, dtype=np.int64)
+        rows = np.searchsorted(ids, raw_ids).clip(max=max(len(ids) - 1, 0))
+        found = ids[rows] == raw_ids if len(ids) else np.zeros(raw_ids.shape, bool)
+        return rows, found
+
+    def score(self, user_ids):
+        """
+        Return a (len(user_ids), n_items) matrix of predicted ratings.
+        Unknown users get the same baseline as surprise: mean + item bias.
+        """
+        rows, found = self._lookup(self.user_ids, user_ids)
+        user_factors = self.user_factors[rows] * found[:, None]
+        user_biases = self.user_biases[rows] * found
+        # Add the biases in place so only the product's matrix is allocated
+        scores = user_factors @ self.item_factors.T
+        scores += self.item_biases[None, :]
+        scores += (self.global_mean + user_biases)[:, None]
+        return scores
+
+    def batch_size(self, memory_budget=SCORE_MEMORY_BUDGET):
+        """Return how many users can be scored at once within memory_budget."""
+        n_items = max(len(self.item_ids), 1)
+        return max(memory_budget // (n_items * SCORE_BYTES_PER_CELL), 1)
+
+    def top_n(self, user_id, n=5, exclude=()):
+        """Return up to n raw book ids for one user, best first."""
+        return self.top_n_batch([user_id], n=n, exclude={user_id: exclude})[0]
+
+    def top_n_batch(
+        self, user_ids, n=5, exclude=None, memory_budget=SCORE_MEMORY_BUDGET
+    ):
+        """
+        Return a list of up to n raw book ids for every user in user_ids.
+        `exclude` maps a user id to the book ids they have already rated.
+        Users are scored in batches that fit in memory_budget.
+        """
+        exclude = exclude or {}
+        user_ids = list(user_ids)
+        if len(self.item_ids) == 0 or n <= 0:
+            return [[] for _ in user_ids]
+
+        size = self.batch_size(memory_budget)
+        top = []
+        for start in range(0, len(user_ids), size):
+            top += self._top_n(user_ids[start : start + size], n, exclude)
+        return top
+
+    def _top_n(self, user_ids, n, exclude):
+        scores = self.score(user_ids)
+        n_items = scores.shape[1]
+
+        # Rated books drop out by scoring -inf in place
+        for row, user_id in enumerate(user_ids):
+            rated = list(exclude.get(user_id, ()))
+            if rated:
+                cols, found = self._lookup(self.item_ids, rated)
+                scores[row, cols[found]] = -np.inf
+
+        # Partial sort: the best k columns of each row end up last, unordered
+        k = min(n, n_items)
+        top = np.argpartition(scores, n_items - k, axis=1)[:, n_items - k :]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        return [
+            [int(book_id) for book_id in self.item_ids[cols[np.isfinite(row)]]]
+            for cols, row in zip(top, top_scores)
+        ]
@@ -0,0 +1,164 @@
+"""
+Full-text search over book title, author and description.
+
+PostgreSQL keeps a generated, weighted `tsvector` column with a GIN index;
+SQLite keeps an external-content FTS5 table maintained by triggers. Either
+way the index is updated by the database whenever a Book row is saved, so
+searching only touches matching rows instead of scanning the catalog.
+"""
+
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from .models import BOOK_ORDERING_FIELDS, Book
+from .pagination import clean_ordering
+
+SEARCH_RANK = "search_rank"
+
+FTS_TABLE = f"{Book._meta.db_table}_fts"
+SEARCH_VECTOR_COLUMN = "search_vector"
+SEARCH_VECTOR_INDEX = f"{Book._meta.db_table}_search_vector_idx"
+
+# Weights follow the columns: a title hit counts most, a description hit least
+POSTGRES_SEARCH_VECTOR = (
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(author, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'C')"
+)
+SQLITE_BM25_WEIGHTS = "bm25(10.0, 5.0, 1.0)"
+
+
+def _terms(query):
+    """Split user input into plain word tokens, dropping query syntax."""
+    return re.findall(r"\w+", query or "")
+
+
+def install_search_index(connection):
+    """Create the database-side search index. Safe to run repeatedly."""
+    qn = connection.ops.quote_name
+    book_table = qn(Book._meta.db_table)
+
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(
+                f"ALTER TABLE {book_table} ADD COLUMN IF NOT EXISTS "
+                f"{SEARCH_VECTOR_COLUMN} tsvector "
+                f"GENERATED ALWAYS AS ({POSTGRES_SEARCH_VECTOR}) STORED"
+            )
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {qn(SEARCH_VECTOR_INDEX)} "
+                f"ON {book_table} USING gin ({SEARCH_VECTOR_COLUMN})"
+            )
+
+        elif connection.vendor == "sqlite":
+            fts = qn(FTS_TABLE)
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s",
+                [FTS_TABLE],
+            )
+            if cursor.fetchone():
+                return
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE {fts} USING fts5("
+                "title, author, description, "
+                f"content={book_table}, content_rowid='id', "
+                "tokenize='porter unicode61')"
+            )
+            cursor.execute(
+                f"INSERT INTO {fts}({fts}, rank) VALUES ('rank', %s)",
+                [SQLITE_BM25_WEIGHTS],
+            )
+            new_row = "new.id, new.title, new.author, new.description"
+            old_row = "old.id, old.title, old.author, old.description"
+            delete_old = (
+                f"INSERT INTO {fts}({fts}, rowid, title, author, description) "
+                f"VALUES ('delete', {old_row});"
+            )
+            insert_new = (
+                f"INSERT INTO {fts}(rowid, title, author, description) "
+                f"VALUES ({new_row});"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER {qn(FTS_TABLE + '_ai')} AFTER INSERT ON "
+                f"{book_table} BEGIN {insert_new} END"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER {qn(FTS_TABLE + '_ad')} AFTER DELETE ON "
+                f"{book_table} BEGIN {delete_old} END"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER {qn(FTS_TABLE + '_au')} AFTER UPDATE OF "
+                f"title, author, description ON {book_table} "
+                f"BEGIN {delete_old} {insert_new} END"
+            )
+            # Index the books that existed before the table was created
+            cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def search_books(queryset, query):
+    """
+    Narrow a Book queryset to the books matching `query` and annotate each
+    with `search_rank`, where a higher rank means a better match.
+    """
+    terms = _terms(query)
+    if not terms:
+        return queryset.annotate(**{SEARCH_RANK: Value(0.0)}).none()
+
+    connection = connections[queryset.db]
+    qn = connection.ops.quote_name
+    book_id = f"{qn(Book._meta.db_table)}.{qn('id')}"
+
+    if connection.vendor == "postgresql":
+        # Prefix matching on every term, ANDed together
+        tsquery = " & ".join(f"{term}:*" for term in terms)
+        rank = RawSQL(
+            f"ts_rank({SEARCH_VECTOR_COLUMN}, to_tsquery('english', %s))",
+            [tsquery],
+            output_field=FloatField(),
+        )
+        matches = RawSQL(
+            f"{SEARCH_VECTOR_COLUMN} @@ to_tsquery('english', %s)",
+            [tsquery],
+            output_field=BooleanField(),
+        )
+        return queryset.filter(matches).annotate(**{SEARCH_RANK: rank})
+
+    if connection.vendor == "sqlite":
+        fts = qn(FTS_TABLE)
+        # Quote every term so FTS5 never parses user input as query syntax
+        match = " ".join(f'"{term}"*' for term in terms)
+        matching_ids = RawSQL(f"SELECT rowid FROM {fts} WHERE {fts} MATCH %s", [match])
+        # FTS5 bm25 is lower-is-better, so flip the sign
+        rank = RawSQL(
+            f"(SELECT -rank FROM {fts} WHERE {fts} MATCH %s AND rowid = {book_id})",
+            [match],
+            output_field=FloatField(),
+        )
+        return queryset.filter(id__in=matching_ids).annotate(**{SEARCH_RANK: rank})
+
+    # Other databases get an unranked substring match
+    condition = Q()
+    for term in terms:
+        condition &= (
+            Q(title__icontains=term)
+            | Q(author__icontains=term)
+            | Q(description__icontains=term)
+        )
+    return queryset.filter(condition).annotate(
+        **{SEARCH_RANK: Value(0.0, output_field=FloatField())}
+    )
+
+
+def get_catalog_ordering(ordering, queryset):
+    """
+    Resolve the requested catalog ordering. Search results default to
+    relevance; everything else defaults to id.
+    """
+    if SEARCH_RANK in queryset.query.annotations:
+        return clean_ordering(
+            ordering, BOOK_ORDERING_FIELDS + (SEARCH_RANK,), f"-{SEARCH_RANK}"
+        )
+    return clean_ordering(ordering, BOOK_ORDERING_FIELDS)
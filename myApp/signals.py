@@ -0,0 +1,65 @@
+from decimal import Decimal
+from django.db import connections
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .cache_versions import bump_book_card_versions, bump_favorites_version
+from .models import Book, Favorite, Rating
+from .search import install_search_index
+
+
+def _sync_cached_book(rating):
+    """Refresh the rating's in-memory book so callers see the new aggregates."""
+    if Rating.book.is_cached(rating):
+        rating.book.refresh_from_db(fields=["rating_sum", "rating_count", "rating_avg"])
+
+
+@receiver(post_save, sender=Rating)
+def update_book_rating_on_save(sender, instance, created, **kwargs):
+    books = Book.objects.filter(pk=instance.book_id)
+    new_rate = Decimal(str(instance.rate))
+    previous_rate = getattr(instance, "_loaded_rate", None)
+
+    if created:
+        updated = books.apply_rating_delta(new_rate, 1)
+    elif previous_rate is not None:
+        updated = books.apply_rating_delta(new_rate - previous_rate, 0)
+    else:
+        # We don't know what was stored before, so rebuild this book
+        updated = books.rebuild_rating_aggregates()
+
+    instance._loaded_rate = new_rate
+    if updated:
+        _sync_cached_book(instance)
+        bump_book_card_versions(instance.book_id)
+
+
+@receiver(post_delete, sender=Rating)
+def update_book_rating_on_delete(sender, instance, **kwargs):
+    rate = Decimal(str(instance.rate))
+    books = Book.objects.filter(pk=instance.book_id)
+    if books.apply_rating_delta(-rate, -1):
+        _sync_cached_book(instance)
+        bump_book_card_versions(instance.book_id)
+
+
+@receiver(post_save, sender=Book)
+def invalidate_book_card_on_save(sender, instance, **kwargs):
+    # Covers stock edits from BookUpdateView, the admin and the API
+    bump_book_card_versions(instance.pk)
+
+
+@receiver(post_delete, sender=Book)
+def invalidate_book_card_on_delete(sender, instance, **kwargs):
+    bump_book_card_versions(instance.pk)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+def invalidate_favorites(sender, instance, **kwargs):
+    # `is_favorite` is part of every book the API returns to this user
+    bump_favorites_version(instance.user_id)
+
+
+def create_search_index(sender, using, **kwargs):
+    """Connected to post_migrate in MyappConfig.ready()."""
+    install_search_index(connections[using])
@@ -0,0 +1,17 @@
+from celery import shared_task
+from . import recommend
+
+
+@shared_task
+def train_recommendation_model():
+    """Retrain the recommendation model, then refresh the stored lists."""
+    version = recommend.train_model()
+    if version is not None:
+        refresh_user_recommendations.delay()
+    return version
+
+
+@shared_task
+def refresh_user_recommendations(chunk_size=None):
+    """Refill UserRecommendation from the latest trained model."""
+    return recommend.refresh_user_recommendations(chunk_size=chunk_size)
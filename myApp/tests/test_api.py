@@ -1,7 +1,9 @@
 import pytest
 from django.urls import reverse
 from rest_framework import status
-from myApp.models import Book
+from myApp.api.pagination import BookCursorPagination
+from myApp.models import Book, Favorite, Rating
+from myApp.pagination import KeysetPaginator
 
 
 # --- Fixture for the URL ---
@@ -21,7 +23,7 @@ def test_get_books_list_public(api_client, create_book, books_url):
     create_book(title="Book 2")
     response = api_client.get(books_url)
     assert response.status_code == status.HTTP_200_OK
-    assert len(response.data) == 2
+    assert len(response.data["results"]) == 2
 
 
 @pytest.mark.django_db
@@ -44,8 +46,8 @@ def test_filter_books_by_title(api_client, create_book, books_url):
     create_book(title="Lord of the Rings")
     response = api_client.get(books_url, {"title": "Harry"})
     assert response.status_code == status.HTTP_200_OK
-    assert len(response.data) == 1
-    assert response.data[0]["title"] == "Harry Potter"
+    assert len(response.data["results"]) == 1
+    assert response.data["results"][0]["title"] == "Harry Potter"
 
 
 @pytest.mark.django_db
@@ -54,10 +56,62 @@ def test_order_books(api_client, create_book, books_url):
     b1 = create_book(title="Cheap", price=10.00)
     b2 = create_book(title="Expensive", price=50.00)
     response = api_client.get(books_url, {"ordering": "price"})
-    assert response.data[0]["id"] == b1.id
-    assert response.data[1]["id"] == b2.id
+    assert response.data["results"][0]["id"] == b1.id
+    assert response.data["results"][1]["id"] == b2.id
     response = api_client.get(books_url, {"ordering": "-price"})
-    assert response.data[0]["id"] == b2.id
+    assert response.data["results"][0]["id"] == b2.id
+
+
+@pytest.mark.django_db
+def test_books_cursor_pagination_walks_all_pages(
+    api_client, create_book, books_url, monkeypatch
+):
+    """Test next/previous links walk the catalog on (price, id) without gaps."""
+    monkeypatch.setattr(BookCursorPagination, "page_size", 2)
+    # Duplicate prices make sure ties are broken by id
+    books = [create_book(title=f"B{i}", price=p) for i, p in enumerate([5, 5, 5, 9, 1])]
+    expected = [b.id for b in sorted(books, key=lambda b: (b.price, b.id))]
+
+    seen, pages, url = [], [], books_url + "?ordering=price"
+    while url:
+        response = api_client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        pages.append(response.data)
+        seen += [item["id"] for item in response.data["results"]]
+        url = response.data["next"]
+
+    assert seen == expected
+    assert pages[0]["previous"] is None
+
+    back = api_client.get(pages[-1]["previous"]).data
+    assert [item["id"] for item in back["results"]] == expected[2:4]
+
+
+@pytest.mark.django_db
+def test_books_invalid_cursor_returns_404(api_client, books_url):
+    """Test a tampered cursor is rejected instead of crashing."""
+    response = api_client.get(books_url, {"cursor": "not-a-cursor"})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+def test_books_forged_cursor_value_returns_404(api_client, create_book, books_url):
+    """Test a well-formed cursor whose key is not a price is rejected."""
+    create_book()
+    cursor = KeysetPaginator.encode_cursor("abc", 1, False)
+
+    response = api_client.get(books_url, {"ordering": "price", "cursor": cursor})
+
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+def test_books_unknown_ordering_falls_back_to_id(api_client, create_book, books_url):
+    """Test ordering on an unsupported field is ignored."""
+    b1 = create_book(title="Z")
+    b2 = create_book(title="A")
+    response = api_client.get(books_url, {"ordering": "stock"})
+    assert [item["id"] for item in response.data["results"]] == [b1.id, b2.id]
 
 
 # --- PERMISSIONS (The Security Check) ---
@@ -181,4 +235,110 @@ def test_search_returns_empty(api_client, create_book, books_url):
     create_book(title="Python Book")
     response = api_client.get(books_url, {"title": "Java"})
     assert response.status_code == status.HTTP_200_OK
-    assert len(response.data) == 0
+    assert len(response.data["results"]) == 0
+
+
+# --- QUERY COUNT ---
+
+
+@pytest.mark.django_db
+def test_books_list_is_a_single_query(
+    api_client, create_user, create_book, books_url, django_assert_num_queries
+):
+    """Test ratings and favorites do not add per-book queries to the list."""
+    user = create_user(email="count@test.com", password="pw")
+    for i in range(10):
+        book = create_book(title=f"Book {i}")
+        Rating.objects.create(user=user, book=book, rate=4.0)
+        if i % 2:
+            Favorite.objects.create(user=user, book=book)
+    api_client.force_authenticate(user=user)
+
+    with django_assert_num_queries(1):
+        response = api_client.get(books_url)
+
+    results = response.data["results"]
+    assert len(results) == 10
+    assert [item["is_favorite"] for item in results] == [False, True] * 5
+    assert all(item["rate_numbers"] == 1 for item in results)
+
+
+@pytest.mark.django_db
+def test_books_list_anonymous_is_a_single_query(
+    api_client, create_book, books_url, django_assert_num_queries
+):
+    """Test anonymous users get is_favorite without touching Favorite."""
+    create_book(title="Book 1")
+    create_book(title="Book 2")
+
+    with django_assert_num_queries(1):
+        response = api_client.get(books_url)
+
+    assert [item["is_favorite"] for item in response.data["results"]] == [False] * 2
+
+
+# --- CONDITIONAL GET ---
+
+
+@pytest.mark.django_db
+def test_books_list_not_modified(
+    api_client, create_book, books_url, django_assert_num_queries
+):
+    """Test a matching If-None-Match is answered with 304 and no queries."""
+    create_book(title="Book 1")
+    response = api_client.get(books_url)
+    etag = response["ETag"]
+    assert etag.startswith('"')
+
+    with django_assert_num_queries(0):
+        response = api_client.get(books_url, HTTP_IF_NONE_MATCH=etag)
+
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response["ETag"] == etag
+    assert not response.content
+
+
+@pytest.mark.django_db
+def test_books_list_etag_changes_with_catalog(
+    api_client, create_user, create_book, books_url, django_capture_on_commit_callbacks
+):
+    """Test book edits and new ratings invalidate the list ETag."""
+    user = create_user(email="etag@test.com", password="pw")
+    with django_capture_on_commit_callbacks(execute=True):
+        book = create_book(title="Book 1")
+    etag = api_client.get(books_url)["ETag"]
+
+    with django_capture_on_commit_callbacks(execute=True):
+        Rating.objects.create(user=user, book=book, rate=5.0)
+    response = api_client.get(books_url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data["results"][0]["rate_numbers"] == 1
+    etag = response["ETag"]
+
+    with django_capture_on_commit_callbacks(execute=True):
+        book.delete()
+    response = api_client.get(books_url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data["results"] == []
+
+
+@pytest.mark.django_db
+def test_book_detail_etag_tracks_favorites(
+    api_client, create_user, create_book, django_capture_on_commit_callbacks
+):
+    """Test the detail ETag is per user and moves when a favorite is added."""
+    user = create_user(email="fav@test.com", password="pw")
+    book = create_book(title="Detail Book")
+    url = reverse("myApp_api:books-detail", args=[book.id])
+    anonymous_etag = api_client.get(url)["ETag"]
+
+    api_client.force_authenticate(user=user)
+    etag = api_client.get(url)["ETag"]
+    assert etag != anonymous_etag
+    assert api_client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+    with django_capture_on_commit_callbacks(execute=True):
+        Favorite.objects.create(user=user, book=book)
+    response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data["is_favorite"] is True
@@ -1,4 +1,6 @@
 import pytest
+from io import StringIO
+from django.core.management import call_command
 from django.core.exceptions import ValidationError
 from django.db.utils import IntegrityError
 from decimal import Decimal
@@ -200,3 +202,94 @@ def test_get_average_rating_empty(create_book):
     book = create_book()
     assert book.get_average_rating() == Decimal("0.0")
     assert book.get_rates_number() == 0
+
+
+# ----- STORED RATING AGGREGATES -----
+
+
+@pytest.mark.django_db
+def test_rating_update_adjusts_stored_aggregates(create_user, create_book):
+    """Test changing a rate shifts the sum and average but not the count."""
+    book = create_book()
+    user = create_user(email="upd@test.com", password="pw")
+    Rating.objects.create(user=user, book=book, rate=2.0)
+
+    Rating.objects.update_or_create(book=book, user=user, defaults={"rate": 5.0})
+
+    book.refresh_from_db()
+    assert book.rating_sum == Decimal("5.0")
+    assert book.rating_count == 1
+    assert book.rating_avg == Decimal("5.0")
+
+
+@pytest.mark.django_db
+def test_rating_delete_adjusts_stored_aggregates(create_user, create_book):
+    """Test deleting a rating removes it from the stored aggregates."""
+    book = create_book()
+    u1 = create_user(email="d1@test.com", password="pw")
+    u2 = create_user(email="d2@test.com", password="pw")
+    Rating.objects.create(user=u1, book=book, rate=5.0)
+    rating = Rating.objects.create(user=u2, book=book, rate=2.0)
+
+    rating.delete()
+
+    book.refresh_from_db()
+    assert book.rating_count == 1
+    assert book.rating_avg == Decimal("5.0")
+
+
+@pytest.mark.django_db
+def test_stored_average_is_rounded(create_user, create_book):
+    """Test the stored average keeps one decimal place."""
+    book = create_book()
+    for i, rate in enumerate([5.0, 4.0, 4.0]):
+        user = create_user(email=f"round{i}@test.com", password="pw")
+        Rating.objects.create(user=user, book=book, rate=rate)
+
+    book.refresh_from_db()
+    # 13 / 3 = 4.333...
+    assert book.rating_avg == Decimal("4.3")
+
+
+@pytest.mark.django_db
+def test_rebuild_rating_aggregates_command(create_user, create_book):
+    """Test the management command repairs drifted aggregates."""
+    book = create_book()
+    empty_book = create_book(title="Unrated")
+    user = create_user(email="cmd@test.com", password="pw")
+    Rating.objects.create(user=user, book=book, rate=3.0)
+    Book.objects.update(rating_sum=99, rating_count=9, rating_avg=1)
+
+    call_command("rebuild_rating_aggregates", stdout=StringIO())
+
+    book.refresh_from_db()
+    empty_book.refresh_from_db()
+    assert (book.rating_sum, book.rating_count) == (Decimal("3.0"), 1)
+    assert book.rating_avg == Decimal("3.0")
+    assert (empty_book.rating_count, empty_book.rating_avg) == (0, Decimal("0.0"))
+
+
+@pytest.mark.django_db
+def test_decrement_stock_returns_new_levels(create_book, django_assert_max_num_queries):
+    """Test stock is taken in one UPDATE and the new levels come back."""
+    first = create_book(stock=10)
+    second = create_book(title="Second", stock=3)
+    untouched = create_book(title="Untouched", stock=7)
+
+    # Savepoint, row locks, the UPDATE, release
+    with django_assert_max_num_queries(4):
+        levels = Book.objects.decrement_stock({second.pk: 1, first.pk: 4})
+
+    assert levels == {first.pk: (6, 0), second.pk: (2, 0)}
+    stock = dict(Book.objects.values_list("pk", "stock"))
+    assert stock == {first.pk: 6, second.pk: 2, untouched.pk: 7}
+
+
+@pytest.mark.django_db
+def test_decrement_stock_stops_at_zero(create_book):
+    """Test an oversold book ends at zero instead of failing the update."""
+    book = create_book(stock=2)
+
+    level = Book.objects.decrement_stock({book.pk: 5})[book.pk]
+    assert (level.stock, level.shortfall) == (0, 3)
+    assert Book.objects.decrement_stock({}) == {}
@@ -1,6 +1,27 @@
+import numpy as np
 import pytest
-from myApp.models import Rating
-from myApp.recommend import get_top_n_recommendations
+from io import StringIO
+from unittest.mock import patch
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
+from myApp import recommend
+from myApp.models import Rating, UserRecommendation
+from myApp.recommend import (
+    get_stored_recommendations,
+    get_top_n_recommendations,
+    load_model,
+    refresh_popular_books,
+    refresh_user_recommendations,
+    train_model,
+)
+from myApp.scoring import FactorScorer
+
+
+@pytest.fixture(autouse=True)
+def model_dir(settings, tmp_path):
+    """Keep trained artifacts of each test in its own directory."""
+    settings.RECOMMENDER_MODEL_DIR = str(tmp_path)
+    return tmp_path
 
 
 @pytest.mark.django_db
@@ -11,10 +32,23 @@ def test_recommendation_empty_db_returns_empty_list():
     instead of crashing Pandas/Surprise.
     """
     user_id = 1
+    assert train_model() is None
     recommendations = get_top_n_recommendations(user_id)
     assert recommendations == []
 
 
+@pytest.mark.django_db
+def test_recommendation_without_trained_model_returns_empty_list(
+    create_user, create_book
+):
+    """Test the serving path never trains a model on its own."""
+    me = create_user(email="untrained@test.com", password="pw")
+    Rating.objects.create(user=me, book=create_book(), rate=5.0)
+
+    assert get_top_n_recommendations(me.id) == []
+    assert load_model() is None
+
+
 @pytest.mark.django_db
 def test_recommendation_returns_unseen_books(create_user, create_book):
     """
@@ -37,6 +71,8 @@ def test_recommendation_returns_unseen_books(create_user, create_book):
     Rating.objects.create(user=other, book=book_unread_1, rate=4.0)
     Rating.objects.create(user=other, book=book_unread_2, rate=5.0)
 
+    train_model()
+
     # Get recommendations for ME
     recs = get_top_n_recommendations(me.id, n=5)
 
@@ -64,9 +100,149 @@ def test_recommendation_limit_n(create_user, create_book):
         Rating.objects.create(user=other, book=book, rate=5.0)
 
     # I rate nothing (Cold Start)
+    train_model()
 
     # Ask for top 3
     recs = get_top_n_recommendations(me.id, n=3)
 
     # Should get exactly 3 items max
     assert len(recs) <= 3
+
+
+@pytest.mark.django_db
+def test_recommendation_skips_books_rated_after_training(create_user, create_book):
+    """Test that ratings newer than the model are still filtered out."""
+    me = create_user(email="late@test.com", password="pw")
+    other = create_user(email="other@test.com", password="pw")
+    books = [create_book(title=f"Book {i}") for i in range(3)]
+    for book in books:
+        Rating.objects.create(user=other, book=book, rate=4.0)
+    train_model()
+
+    Rating.objects.create(user=me, book=books[0], rate=5.0)
+
+    assert books[0].id not in get_top_n_recommendations(me.id)
+
+
+@pytest.mark.django_db
+def test_train_recommender_command_publishes_new_version(
+    create_user, create_book, model_dir
+):
+    """Test the command writes a versioned artifact and points `current` at it."""
+    user = create_user(email="cmd@test.com", password="pw")
+    Rating.objects.create(user=user, book=create_book(), rate=4.0)
+
+    call_command("train_recommender", stdout=StringIO())
+
+    current = model_dir / "current"
+    assert current.is_symlink()
+    assert (current / "item_factors.npy").exists()
+    assert load_model().version == current.resolve().name
+
+
+@pytest.mark.django_db
+def test_new_version_is_picked_up_without_restart(create_user, create_book):
+    """Test the serving path follows the symlink swap to a new version."""
+    user = create_user(email="swap@test.com", password="pw")
+    Rating.objects.create(user=user, book=create_book(), rate=4.0)
+    first = train_model()
+    assert load_model().version == first
+
+    second = train_model()
+
+    assert second != first
+    assert load_model().version == second
+
+
+@pytest.mark.django_db
+def test_loaded_factors_are_memory_mapped(create_user, create_book):
+    """Test the factor matrices are mapped read-only rather than copied."""
+    user = create_user(email="mmap@test.com", password="pw")
+    Rating.objects.create(user=user, book=create_book(), rate=4.0)
+    train_model()
+
+    scorer = load_model()
+
+    assert isinstance(scorer.item_factors, np.memmap)
+    assert scorer.item_factors.flags.writeable is False
+
+
+# ----- STORED RECOMMENDATIONS -----
+
+
+@pytest.mark.django_db
+def test_refresh_stores_rows_in_chunks(create_user, create_book):
+    """Test every user in the model gets a row tagged with the model version."""
+    users = [create_user(email=f"u{i}@test.com", password="pw") for i in range(3)]
+    books = [create_book(title=f"Book {i}") for i in range(4)]
+    for user in users:
+        Rating.objects.create(user=user, book=books[0], rate=4.0)
+    Rating.objects.create(user=users[0], book=books[1], rate=5.0)
+    version = train_model()
+
+    assert refresh_user_recommendations(n=2, chunk_size=2) == 3
+
+    row = UserRecommendation.objects.get(user=users[0])
+    assert row.model_version == version
+    assert books[0].id not in row.book_ids
+    assert books[1].id not in row.book_ids
+    assert UserRecommendation.objects.filter(user__isnull=False).count() == 3
+
+
+@pytest.mark.django_db
+def test_refresh_chunks_follow_the_scoring_memory_budget(create_user, create_book):
+    """Test the default chunk size comes from the scorer's memory budget."""
+    users = [create_user(email=f"m{i}@test.com", password="pw") for i in range(3)]
+    book = create_book(title="Only")
+    for user in users:
+        Rating.objects.create(user=user, book=book, rate=4.0)
+    train_model()
+
+    with (
+        patch.object(FactorScorer, "batch_size", return_value=2),
+        patch(
+            "myApp.recommend.get_recommendations_for_users",
+            wraps=recommend.get_recommendations_for_users,
+        ) as score_chunk,
+    ):
+        assert refresh_user_recommendations(n=2) == 3
+
+    assert [len(call.args[0]) for call in score_chunk.call_args_list] == [2, 1]
+
+
+@pytest.mark.django_db
+def test_refresh_without_model_stores_popularity_only(create_user, create_book):
+    """Test the popularity list is stored even before any training."""
+    user = create_user(email="pop@test.com", password="pw")
+    quiet = create_book(title="Quiet")
+    popular = create_book(title="Popular")
+    Rating.objects.create(user=user, book=popular, rate=4.0)
+
+    assert refresh_user_recommendations(n=2) == 0
+
+    fallback = UserRecommendation.objects.get(user__isnull=True)
+    assert fallback.book_ids == [popular.id, quiet.id]
+
+
+@pytest.mark.django_db
+def test_popularity_fallback_is_a_single_row(create_book):
+    """Test repeated refreshes reuse one fallback row and a second is refused."""
+    create_book()
+    refresh_popular_books()
+    refresh_popular_books()
+
+    assert UserRecommendation.objects.filter(user__isnull=True).count() == 1
+    with pytest.raises(IntegrityError), transaction.atomic():
+        UserRecommendation.objects.create(user=None, model_version="p")
+
+
+@pytest.mark.django_db
+def test_stored_recommendations_fall_back_to_popularity(create_user):
+    """Test users without a row get the popularity list."""
+    me = create_user(email="me@test.com", password="pw")
+    other = create_user(email="other@test.com", password="pw")
+    UserRecommendation.objects.create(user=None, book_ids=[1, 2], model_version="p")
+    UserRecommendation.objects.create(user=other, book_ids=[3], model_version="v1")
+
+    assert get_stored_recommendations(me) == [1, 2]
+    assert get_stored_recommendations(other) == [3]
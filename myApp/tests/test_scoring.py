@@ -0,0 +1,86 @@
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+import pytest
+from surprise import Dataset, Reader, SVD
+from myApp.scoring import FactorScorer
+
+
+@pytest.fixture
+def fitted_svd():
+    """A small SVD model trained on hand-made ratings (no database needed)."""
+    ratings = pd.DataFrame(
+        {
+            "user_id": [1, 1, 2, 2, 2, 3, 3],
+            "book_id": [10, 20, 10, 30, 40, 20, 40],
+            "rate": [5, 3, 4, 2, 5, 1, 4],
+        }
+    )
+    data = Dataset.load_from_df(ratings, Reader(rating_scale=(1, 5)))
+    model = SVD(random_state=0)
+    model.fit(data.build_full_trainset())
+    return model
+
+
+def test_scores_match_surprise_predictions(fitted_svd):
+    """Test the matrix product gives the same estimates as model.predict()."""
+    scorer = FactorScorer.from_svd(fitted_svd)
+    scores = scorer.score([3, 1, 99])
+
+    for row, user_id in enumerate([3, 1, 99]):
+        for col, book_id in enumerate(scorer.item_ids):
+            expected = fitted_svd.predict(user_id, book_id, clip=False).est
+            assert scores[row, col] == pytest.approx(expected)
+
+
+def test_top_n_excludes_rated_books_and_sorts(fitted_svd):
+    """Test rated books are masked and results come best first."""
+    scorer = FactorScorer.from_svd(fitted_svd)
+    recs = scorer.top_n(1, n=5, exclude=[10, 20])
+
+    assert set(recs) == {30, 40}
+    scores = dict(zip(scorer.item_ids, scorer.score([1])[0]))
+    assert scores[recs[0]] >= scores[recs[1]]
+
+
+def test_top_n_batch_matches_single_user_calls(fitted_svd):
+    """Test scoring many users at once gives the same answer as one by one."""
+    scorer = FactorScorer.from_svd(fitted_svd)
+    exclude = {1: [10], 2: [10, 30, 40]}
+
+    batch = scorer.top_n_batch([1, 2, 3], n=2, exclude=exclude)
+
+    assert batch == [
+        scorer.top_n(u, n=2, exclude=exclude.get(u, ())) for u in [1, 2, 3]
+    ]
+    assert batch[1] == [20]
+
+
+def test_top_n_batch_scores_within_memory_budget(fitted_svd):
+    """Test a small budget scores fewer users per product, same answer."""
+    scorer = FactorScorer.from_svd(fitted_svd)
+    n_items = len(scorer.item_ids)
+    exclude = {1: [10], 2: [10, 30, 40]}
+
+    assert scorer.batch_size(memory_budget=2 * n_items * 16) == 2
+    assert scorer.batch_size(memory_budget=1) == 1
+    with patch.object(scorer, "score", wraps=scorer.score) as score:
+        batch = scorer.top_n_batch(
+            [1, 2, 3], n=2, exclude=exclude, memory_budget=2 * n_items * 16
+        )
+
+    assert [len(call.args[0]) for call in score.call_args_list] == [2, 1]
+    assert batch == scorer.top_n_batch([1, 2, 3], n=2, exclude=exclude)
+
+
+def test_save_and_memory_mapped_load_round_trip(fitted_svd, tmp_path):
+    """Test the saved .npy files rebuild an identical, read-only scorer."""
+    scorer = FactorScorer.from_svd(fitted_svd)
+    scorer.save(tmp_path)
+
+    loaded = FactorScorer.load(tmp_path, mmap_mode="r")
+
+    assert isinstance(loaded.user_factors, np.memmap)
+    assert np.allclose(loaded.score([1, 2]), scorer.score([1, 2]))
+    assert loaded.top_n(1, n=3) == scorer.top_n(1, n=3)
@@ -0,0 +1,102 @@
+import pytest
+from django.urls import reverse
+from myApp.models import Book
+from myApp.search import search_books
+
+
+def search(query):
+    return list(search_books(Book.objects.all(), query).order_by("-search_rank"))
+
+
+@pytest.mark.django_db
+def test_search_matches_title_author_and_description(create_book):
+    """Test each indexed column is searchable."""
+    by_title = create_book(title="Dune", author="Frank Herbert")
+    by_author = create_book(title="Emma", author="Jane Austen")
+    by_description = Book.objects.create(
+        title="Untitled", author="Anon", price=1, description="A desert planet saga"
+    )
+
+    assert search("dune") == [by_title]
+    assert search("austen") == [by_author]
+    assert search("desert") == [by_description]
+
+
+@pytest.mark.django_db
+def test_search_ranks_title_hits_above_description_hits(create_book):
+    """Test relevance ordering weights the title more than the description."""
+    in_description = Book.objects.create(
+        title="Cookbook", author="Chef", price=1, description="Recipes from Python"
+    )
+    in_title = create_book(title="Python Crash Course")
+
+    assert search("python") == [in_title, in_description]
+
+
+@pytest.mark.django_db
+def test_search_index_follows_saves_and_deletes(create_book):
+    """Test the index is updated by the database when a book changes."""
+    book = create_book(title="Old Name")
+
+    book.title = "Brand New Name"
+    book.save()
+    assert search("old") == []
+    assert search("brand") == [book]
+
+    book.delete()
+    assert search("brand") == []
+
+
+@pytest.mark.django_db
+def test_search_uses_prefixes_and_ignores_query_syntax(create_book):
+    """Test partial words match and FTS operators in user input are harmless."""
+    book = create_book(title="Harry Potter")
+
+    assert search("harr pot") == [book]
+    assert search('"harry" (potter^') == [book]
+    assert search("*** ---") == []
+
+
+@pytest.mark.django_db
+def test_books_api_search_param(api_client, create_book):
+    """Test ?q= returns ranked results from the books API."""
+    create_book(title="Learning Django", author="Someone")
+    create_book(title="Gardening", author="Django Reinhardt")
+    create_book(title="Unrelated")
+
+    response = api_client.get(reverse("myApp_api:books-list"), {"q": "django"})
+
+    titles = [item["title"] for item in response.data["results"]]
+    assert titles == ["Learning Django", "Gardening"]
+
+
+@pytest.mark.django_db
+def test_shopping_page_search_box(client, create_book):
+    """Test the shopping page filters books by the search box."""
+    create_book(title="Searchable Book")
+    create_book(title="Hidden Book")
+
+    response = client.get(reverse("myApp:shopping"), {"q": "searchable"})
+
+    assert [b.title for b in response.context["books"]] == ["Searchable Book"]
+    assert response.context["ordering"] == "-search_rank"
+
+
+@pytest.mark.django_db
+def test_books_api_search_results_page_by_rank(api_client, create_book, monkeypatch):
+    """Test keyset pagination walks search results in relevance order."""
+    from myApp.api.pagination import BookCursorPagination
+
+    monkeypatch.setattr(BookCursorPagination, "page_size", 1)
+    for title in ["Rust", "Rust in Action", "Programming Rust", "Go"]:
+        create_book(title=title)
+    expected = [b.title for b in search("rust")]
+
+    seen, url = [], reverse("myApp_api:books-list") + "?q=rust"
+    while url:
+        response = api_client.get(url)
+        seen += [item["title"] for item in response.data["results"]]
+        url = response.data["next"]
+
+    assert seen == expected
+    assert len(seen) == 3
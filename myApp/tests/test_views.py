@@ -1,6 +1,6 @@
 import pytest
 from django.urls import reverse
-from myApp.models import Book, Favorite, Rating
+from myApp.models import Book, Favorite, Rating, UserRecommendation
 
 
 # ----- Helper Fixture -----
@@ -40,6 +40,40 @@ def test_home_page_loads(client):
     assert "myApp/index.html" in [t.name for t in response.templates]
 
 
+@pytest.mark.django_db
+def test_home_page_reads_stored_recommendations(
+    client, create_user, book_factory, django_assert_max_num_queries
+):
+    """Test the home page shows the stored list in order without scoring."""
+    user = create_user(email="recs@test.com", password="pw")
+    first = book_factory(title="First Pick")
+    second = book_factory(title="Second Pick")
+    UserRecommendation.objects.create(
+        user=user, book_ids=[second.id, first.id], model_version="v1"
+    )
+    client.force_login(user)
+
+    with django_assert_max_num_queries(5):
+        response = client.get(reverse("myApp:home"))
+
+    assert list(response.context["recommended_books"]) == [second, first]
+
+
+@pytest.mark.django_db
+def test_home_page_uses_popularity_fallback(client, create_user, book_factory):
+    """Test a user without a stored row sees the popularity list."""
+    user = create_user(email="new@test.com", password="pw")
+    popular = book_factory(title="Popular Pick")
+    UserRecommendation.objects.create(
+        user=None, book_ids=[popular.id], model_version="popularity"
+    )
+    client.force_login(user)
+
+    response = client.get(reverse("myApp:home"))
+
+    assert list(response.context["recommended_books"]) == [popular]
+
+
 # ----- DETAIL VIEW -----
 
 
@@ -186,6 +220,97 @@ def test_shopping_list_annotates_favorites(client, create_user, book_factory):
     assert getattr(obj_neutral, "is_favorite", False) is False
 
 
+@pytest.mark.django_db
+def test_shopping_list_keyset_pages(client, book_factory):
+    """Test the catalog is split into pages linked by cursors."""
+    books = [book_factory(title=f"Book {i:02}") for i in range(14)]
+    url = reverse("myApp:shopping")
+
+    first = client.get(url, {"ordering": "title"})
+    page = first.context["page_obj"]
+    assert list(first.context["books"]) == books[:12]
+    assert page.has_previous() is False
+
+    second = client.get(url, {"ordering": "title", "cursor": page.next_cursor})
+    assert list(second.context["books"]) == books[12:]
+    assert second.context["page_obj"].has_next() is False
+
+
+@pytest.mark.django_db
+def test_shopping_list_invalid_cursor_is_404(client):
+    """Test a broken cursor gives a 404 instead of a server error."""
+    response = client.get(reverse("myApp:shopping"), {"cursor": "%%%"})
+    assert response.status_code == 404
+
+
+# ----- BOOK CARD FRAGMENT CACHE -----
+
+
+@pytest.mark.django_db
+def test_book_card_is_served_from_cache_until_book_saved(
+    client, book_factory, django_capture_on_commit_callbacks
+):
+    """Test the card is cached and a Book save invalidates it."""
+    book = book_factory(title="First Title")
+    url = reverse("myApp:shopping")
+    client.get(url)
+
+    # A raw UPDATE bypasses the signals, so the cached card is still served
+    Book.objects.filter(pk=book.pk).update(title="Sneaky Title")
+    assert "First Title" in client.get(url).content.decode()
+
+    with django_capture_on_commit_callbacks(execute=True):
+        book.title = "Saved Title"
+        book.save()
+    assert "Saved Title" in client.get(url).content.decode()
+
+
+@pytest.mark.django_db
+def test_book_card_follows_stock_without_a_version_bump(client, book_factory):
+    """Test a card cached from a row read mid-write is not reused."""
+    book = book_factory(stock=7)
+    url = reverse("myApp:shopping")
+    assert "7 in stock" in client.get(url).content.decode()
+
+    # Same version, as when the bump ran before the old row was cached
+    Book.objects.filter(pk=book.pk).update(stock=3)
+    assert "3 in stock" in client.get(url).content.decode()
+
+
+@pytest.mark.django_db
+def test_book_card_invalidated_by_rating(
+    client, create_user, book_factory, django_capture_on_commit_callbacks
+):
+    """Test a new rating shows up on the card straight away."""
+    user = create_user(email="stars@test.com", password="pw")
+    book = book_factory()
+    url = reverse("myApp:shopping")
+    assert "(0)" in client.get(url).content.decode()
+
+    with django_capture_on_commit_callbacks(execute=True):
+        Rating.objects.create(user=user, book=book, rate=4.0)
+
+    assert "(1)" in client.get(url).content.decode()
+
+
+@pytest.mark.django_db
+def test_favorite_state_is_not_cached(client, create_user, book_factory):
+    """Test users sharing a cached card still see their own favorite state."""
+    fan = create_user(email="fan@test.com", password="pw")
+    other = create_user(email="other@test.com", password="pw")
+    book = book_factory()
+    Favorite.objects.create(user=fan, book=book)
+    url = reverse("myApp:shopping")
+
+    client.force_login(fan)
+    assert "Remove Favorite" in client.get(url).content.decode()
+
+    client.force_login(other)
+    content = client.get(url).content.decode()
+    assert "Remove Favorite" not in content
+    assert "Add Favorite" in content
+
+
 @pytest.mark.django_db
 def test_shopping_list_clears_session_flag(client, book_factory):
     """Test that visiting the shopping list resets the double-purchase flag."""
@@ -1,30 +1,54 @@
 from django.views import generic
 from django.shortcuts import get_object_or_404, redirect
+from django.http import Http404
 from django.urls import reverse_lazy
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
-from django.db.models import Exists, OuterRef
 from django.contrib.auth.decorators import login_required
 
 from .models import Book, Favorite, Rating
+from .pagination import InvalidCursor, KeysetPaginator
+from .search import get_catalog_ordering, search_books
 from .forms import RatingForm
-from .recommend import get_top_n_recommendations
+from .cache_versions import BOOK_CARD_TIMEOUT, get_book_card_versions
+from .recommend import get_stored_recommendations
 
 
 class ShoppingListView(generic.ListView):
     context_object_name = "books"
     template_name = "myApp/shopping.html"
+    paginate_by = 12
 
     def get_queryset(self):
         self.request.session["prevent_double_purchase"] = False
         qs = Book.objects.all()
-        if self.request.user.is_authenticated:
-            qs = qs.annotate(
-                is_favorite=Exists(
-                    Favorite.objects.filter(user=self.request.user, book=OuterRef("pk"))
-                )
-            )
-        return qs
+        query = self.request.GET.get("q")
+        if query:
+            qs = search_books(qs, query)
+        return qs.with_is_favorite(self.request.user)
+
+    def paginate_queryset(self, queryset, page_size):
+        """Keyset pagination: deep pages cost the same as the first one."""
+        self.ordering = get_catalog_ordering(self.request.GET.get("ordering"), queryset)
+        paginator = KeysetPaginator(queryset, self.ordering, page_size)
+        try:
+            page = paginator.page(self.request.GET.get("cursor"))
+        except InvalidCursor as e:
+            raise Http404(str(e))
+        return (None, page, page.object_list, page.has_other_pages())
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["ordering"] = self.ordering
+        context["query"] = self.request.GET.get("q", "")
+
+        # The template caches each card under its current version
+        books = context["books"]
+        versions = get_book_card_versions([book.pk for book in books])
+        for book in books:
+            book.card_version = versions[book.pk]
+        context["card_timeout"] = BOOK_CARD_TIMEOUT
+        return context
 
 
 class IndexView(generic.TemplateView):
@@ -34,9 +58,11 @@ class IndexView(generic.TemplateView):
         context = super().get_context_data(**kwargs)
 
         if self.request.user.is_authenticated:
-            recommended_ids = get_top_n_recommendations(self.request.user.id)
-            recommended_books = Book.objects.filter(id__in=recommended_ids)
-            context["recommended_books"] = recommended_books
+            recommended_ids = get_stored_recommendations(self.request.user)
+            books = Book.objects.in_bulk(recommended_ids)
+            context["recommended_books"] = [
+                books[book_id] for book_id in recommended_ids if book_id in books
+            ]
         else:
             context["recommended_books"] = []
 
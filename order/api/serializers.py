@@ -1,8 +1,7 @@
 from rest_framework import serializers
+from order.checkout import CheckoutError, check_stock, get_cart_items, place_order
 from order.models import Order, OrderItem
-from cart.models import Cart
 from cart.api.serializers import MiniBookSerializer
-from django.db import transaction
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
@@ -14,8 +13,10 @@ class OrderItemSerializer(serializers.ModelSerializer):
 
 
 class OrderSerializer(serializers.ModelSerializer):
-    total_cost = serializers.SerializerMethodField()
-    total_quantity = serializers.SerializerMethodField()
+    # A JSON number, as it was before the total was stored on the order
+    total_cost = serializers.DecimalField(
+        max_digits=12, decimal_places=2, coerce_to_string=False, read_only=True
+    )
     items = OrderItemSerializer(many=True, read_only=True)
 
     class Meta:
@@ -29,6 +30,7 @@ class OrderSerializer(serializers.ModelSerializer):
             "updated_at",
             "total_quantity",
             "total_cost",
+            "item_count",
             "items",
         ]
         read_only_fields = [
@@ -37,14 +39,9 @@ class OrderSerializer(serializers.ModelSerializer):
             "updated_at",
             "total_quantity",
             "total_cost",
+            "item_count",
         ]
 
-    def get_total_cost(self, obj):
-        return obj.get_total_cost()
-
-    def get_total_quantity(self, obj):
-        return sum(item.quantity for item in obj.items.all())
-
 
 class CreateOrderSerializer(serializers.ModelSerializer):
     class Meta:
@@ -52,37 +49,15 @@ class CreateOrderSerializer(serializers.ModelSerializer):
         fields = ["first_name", "last_name", "email"]
 
     def validate(self, attrs):
-        user = self.context["request"].user
-
+        # Fail early; place_order() checks again with the cart locked
         try:
-            cart = Cart.objects.get(user=user)
-        except Cart.DoesNotExist:
-            raise serializers.ValidationError("Your cart is empty!")
-
-        for item in cart.items.all():
-            if item.quantity > item.book.stock:
-                raise serializers.ValidationError(
-                    f"Not enough stock for {item.book.title}. "
-                    f"Only {item.book.stock} left."
-                )
+            check_stock(get_cart_items(self.context["request"].user))
+        except CheckoutError as e:
+            raise serializers.ValidationError(str(e))
         return attrs
 
-    @transaction.atomic
     def create(self, validated_data):
-        user = self.context["request"].user
-        # retrieve the cart and lock it until transaction finishes
-        cart = Cart.objects.select_for_update().get(user=user)
-
-        # create the order
-        order = Order.objects.create(user=user, **validated_data)
-
-        # Move cart items into order
-        for item in cart.items.all():
-            OrderItem.objects.create(
-                order=order,
-                book=item.book,
-                quantity=item.quantity,
-                price=item.book.price,
-            )
-
-        return order
+        try:
+            return place_order(Order(**validated_data), self.context["request"].user)
+        except CheckoutError as e:
+            raise serializers.ValidationError(str(e))
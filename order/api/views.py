@@ -16,7 +16,7 @@ class OrderListAPIView(APIView):
 
     def get(self, request):
         """Bring back all the past orders for this user."""
-        order = Order.objects.filter(user=request.user)
+        order = Order.objects.filter(user=request.user).prefetch_related("items__book")
         serialized_order = OrderSerializer(order, many=True)
         return Response(serialized_order.data, status=status.HTTP_200_OK)
 
@@ -44,7 +44,7 @@ class CreateOrderAPIView(APIView):
             "line_items": [],
         }
 
-        for item in order.items.all():
+        for item in order.items.select_related("book"):
             session_data["line_items"].append(
                 {
                     "price_data": {
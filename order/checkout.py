@@ -0,0 +1,60 @@
+"""
+Turning a user's cart into an order.
+
+Both the order form and the order API go through place_order(), so a
+checkout is one joined read of the cart, one stock comparison over the
+loaded rows and one bulk insert of the order items, all in one transaction.
+"""
+
+from django.db import transaction
+
+from cart.models import CartItem
+from .models import OrderItem
+
+
+class CheckoutError(ValueError):
+    pass
+
+
+def get_cart_items(user, lock=False):
+    """Return the user's cart items with their books, in one joined query."""
+    items = CartItem.objects.filter(cart__user=user).select_related("book")
+    if lock:
+        # Lock the cart rows only; the webhook locks books when it takes stock
+        items = items.select_for_update(of=("self",))
+    return list(items.order_by("pk"))
+
+
+def check_stock(items):
+    """Raise CheckoutError naming the first item the stock cannot cover."""
+    if not items:
+        raise CheckoutError("Your cart is empty!")
+    for item in items:
+        if item.quantity > item.book.stock:
+            raise CheckoutError(
+                f"Not enough stock for {item.book.title}. "
+                f"Only {item.book.stock} left."
+            )
+
+
+@transaction.atomic
+def place_order(order, user):
+    """
+    Save the unsaved order for user and copy the cart into it at current
+    prices. Raises CheckoutError if the cart is empty or short of stock.
+    """
+    items = get_cart_items(user, lock=True)
+    check_stock(items)
+
+    order_items = [
+        OrderItem(book=item.book, price=item.book.price, quantity=item.quantity)
+        for item in items
+    ]
+    order.user = user
+    order.set_totals(order_items)
+    order.save()
+
+    for order_item in order_items:
+        order_item.order = order
+    OrderItem.objects.bulk_create(order_items)
+    return order
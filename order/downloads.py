@@ -0,0 +1,108 @@
+"""
+Serving private files (receipts and their QR codes) after the view has
+checked who may see them.
+
+With settings.RECEIPT_SENDFILE set, the response carries no body: the
+front-end server reads the file named in X-Accel-Redirect or X-Sendfile and
+sends it, so no Python worker is tied up for the transfer. Without it the
+file is streamed in chunks from storage, honouring a single byte Range so
+interrupted downloads can resume.
+"""
+
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.http import content_disposition_header
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class FileRange:
+    """A file-like view of `length` bytes of file, starting at `start`."""
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    Return the (start, end) byte positions, inclusive, asked for by a
+    single-range Range header. None means serve the whole file; ValueError
+    means the range cannot be satisfied.
+    """
+    match = RANGE_RE.match(header or "")
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if not first:
+        # "bytes=-500" is the last 500 bytes
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start > end or start >= size:
+        raise ValueError(f"Range {header!r} not satisfiable for {size} bytes")
+    return start, end
+
+
+def sendfile_response(field_file, content_type, disposition):
+    response = HttpResponse(content_type=content_type)
+    response["Content-Disposition"] = disposition
+    if settings.RECEIPT_SENDFILE == "x-accel-redirect":
+        response["X-Accel-Redirect"] = quote(
+            settings.RECEIPT_SENDFILE_PREFIX + field_file.name
+        )
+    else:
+        response["X-Sendfile"] = field_file.path
+    return response
+
+
+def serve_file(request, field_file, as_attachment=False):
+    """Respond with the contents of a FieldFile the user may download."""
+    filename = os.path.basename(field_file.name)
+    content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+    if settings.RECEIPT_SENDFILE:
+        disposition = content_disposition_header(as_attachment, filename)
+        return sendfile_response(field_file, content_type, disposition)
+
+    size = field_file.size
+    try:
+        byte_range = parse_range(request.headers.get("Range"), size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+
+    file = field_file.open("rb")
+    options = {
+        "content_type": content_type,
+        "as_attachment": as_attachment,
+        "filename": filename,
+    }
+    if byte_range is None:
+        response = FileResponse(file, **options)
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        response = FileResponse(FileRange(file, start, length), status=206, **options)
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Content-Length"] = str(length)
+    response["Accept-Ranges"] = "bytes"
+    return response
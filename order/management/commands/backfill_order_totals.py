@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from order.models import Order
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill in the stored total_cost, total_quantity and item_count of "
+        "orders created before they were recorded at checkout."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Recompute every order, not only those without stored totals.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Orders updated per statement (default: 1000).",
+        )
+
+    def handle(self, *args, **options):
+        orders = Order.objects.all()
+        if not options["all"]:
+            orders = orders.filter(item_count=0)
+
+        batch_size = options["batch_size"]
+        ids = orders.order_by("pk").values_list("pk", flat=True)
+        updated = 0
+        last_id = 0
+        # Walk the ids in ranges so each UPDATE stays short
+        while True:
+            batch = list(ids.filter(pk__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            updated += Order.objects.filter(pk__in=batch).rebuild_totals()
+            last_id = batch[-1]
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Backfilled totals for {updated} orders.")
+        )
@@ -1,7 +1,48 @@
+from decimal import Decimal
+
 from django.db import models
+from django.db.models import Count, DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from django.conf import settings
 
 
+class OrderQuerySet(models.QuerySet):
+    def with_totals(self):
+        """
+        Annotate items_total_cost and items_total_quantity, computed in the
+        database from the prices stored on the order items. Unlike the stored
+        total_cost and total_quantity, these always reflect the current items.
+        """
+        return self.annotate(
+            items_total_cost=Coalesce(
+                Sum(F("items__quantity") * F("items__price")),
+                Value(Decimal("0.00")),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            ),
+            items_total_quantity=Coalesce(Sum("items__quantity"), 0),
+        )
+
+    def rebuild_totals(self):
+        """Recompute the stored totals from the order items in one UPDATE."""
+        items = OrderItem.objects.filter(order=OuterRef("pk")).values("order")
+        cost = Sum(
+            F("quantity") * F("price"),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        )
+        return self.update(
+            total_cost=Coalesce(
+                Subquery(items.annotate(total=cost).values("total")),
+                Value(Decimal("0.00")),
+            ),
+            total_quantity=Coalesce(
+                Subquery(items.annotate(total=Sum("quantity")).values("total")), 0
+            ),
+            item_count=Coalesce(
+                Subquery(items.annotate(total=Count("pk")).values("total")), 0
+            ),
+        )
+
+
 class Order(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     first_name = models.CharField(max_length=50)
@@ -13,6 +54,14 @@ class Order(models.Model):
     stripe_id = models.CharField(max_length=250, blank=True)
     recipt_file = models.FileField(upload_to="recipts/", blank=True)
     qr_file = models.ImageField(upload_to="qr_files/", blank=True)
+    # Fixed at checkout, so order history never has to read the items
+    total_cost = models.DecimalField(
+        max_digits=12, decimal_places=2, default=0, editable=False
+    )
+    total_quantity = models.PositiveIntegerField(default=0, editable=False)
+    item_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = OrderQuerySet.as_manager()
 
     class Meta:
         ordering = ["-created_at"]
@@ -24,6 +73,12 @@ class Order(models.Model):
     def get_total_cost(self):
         return sum(item.get_cost() for item in self.items.all())
 
+    def set_totals(self, items):
+        """Fill in the stored totals from the OrderItems being created."""
+        self.total_cost = sum(item.get_cost() for item in items)
+        self.total_quantity = sum(item.quantity for item in items)
+        self.item_count = len(items)
+
     def get_stripe_url(self):
         if not self.stripe_id:
             return ""
@@ -1,9 +1,10 @@
 import pytest
+from decimal import Decimal
 from unittest.mock import patch, MagicMock
 from django.urls import reverse
 from rest_framework import status
 from cart.models import Cart, CartItem
-from order.models import Order
+from order.models import Order, OrderItem
 
 
 # --- FIXTURES ---
@@ -34,6 +35,29 @@ def test_get_order_list_api(api_client, create_user, order_list_url):
     assert response.data[0]["first_name"] == "Old Order"
 
 
+@pytest.mark.django_db
+def test_get_order_list_api_totals(
+    api_client, create_user, create_book, order_list_url, django_assert_num_queries
+):
+    """Test totals are read from the order rows without per-order queries."""
+    user = create_user(email="sums@test.com", password="pw")
+    for _ in range(3):
+        order = Order.objects.create(user=user)
+        OrderItem.objects.create(order=order, book=create_book(), price=7, quantity=2)
+    Order.objects.rebuild_totals()
+    api_client.force_authenticate(user=user)
+
+    # Orders, then the prefetched items and their books
+    with django_assert_num_queries(3):
+        response = api_client.get(order_list_url)
+
+    assert [o["total_cost"] for o in response.data] == [Decimal("14.00")] * 3
+    # Rendered as a JSON number, not a string
+    assert response.json()[0]["total_cost"] == 14.0
+    assert [o["total_quantity"] for o in response.data] == [2] * 3
+    assert [o["item_count"] for o in response.data] == [1] * 3
+
+
 # --- 2. CREATE ORDER (WITH STRIPE MOCK) ---
 
 
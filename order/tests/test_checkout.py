@@ -0,0 +1,52 @@
+import pytest
+from cart.models import Cart, CartItem
+from order.checkout import CheckoutError, place_order
+from order.models import Order, OrderItem
+
+
+@pytest.mark.django_db
+def test_place_order_copies_cart(
+    create_user, create_book, django_assert_max_num_queries
+):
+    """Test a checkout costs the same few queries however big the cart is."""
+    user = create_user(email="checkout@test.com", password="pw")
+    cart = Cart.objects.create(user=user)
+    for i in range(10):
+        CartItem.objects.create(
+            cart=cart, book=create_book(title=f"Book {i}", price=3), quantity=2
+        )
+
+    # Cart read, order insert, item bulk insert, plus the savepoint pair
+    with django_assert_max_num_queries(5):
+        order = place_order(Order(first_name="A", last_name="B"), user)
+
+    assert order.user == user
+    assert order.items.count() == 10
+    assert (order.total_cost, order.total_quantity, order.item_count) == (60, 20, 10)
+
+
+@pytest.mark.django_db
+def test_place_order_short_of_stock_writes_nothing(create_user, create_book):
+    """Test one item over stock fails the whole checkout."""
+    user = create_user(email="short@test.com", password="pw")
+    cart = Cart.objects.create(user=user)
+    CartItem.objects.create(cart=cart, book=create_book(title="Fine"), quantity=1)
+    CartItem.objects.create(
+        cart=cart, book=create_book(title="Scarce", stock=1), quantity=2
+    )
+
+    with pytest.raises(CheckoutError, match="Not enough stock for Scarce"):
+        place_order(Order(), user)
+
+    assert not Order.objects.exists()
+    assert not OrderItem.objects.exists()
+
+
+@pytest.mark.django_db
+def test_place_order_empty_cart(create_user):
+    """Test an empty cart cannot be checked out."""
+    user = create_user(email="nothing@test.com", password="pw")
+    Cart.objects.create(user=user)
+
+    with pytest.raises(CheckoutError, match="Your cart is empty!"):
+        place_order(Order(), user)
@@ -1,5 +1,7 @@
 import pytest
 from decimal import Decimal
+from io import StringIO
+from django.core.management import call_command
 from order.models import Order, OrderItem
 
 
@@ -80,3 +82,63 @@ def test_order_item_cost_calculation(create_user, create_book):
     item = OrderItem.objects.create(order=order, book=book, price=10.00, quantity=3)
 
     assert item.get_cost() == 30.00
+
+
+@pytest.mark.django_db
+def test_order_with_totals(create_user, create_book, django_assert_num_queries):
+    """Test the database-side totals match the Python ones."""
+    user = create_user(email="with-totals@test.com", password="pw")
+    order = Order.objects.create(user=user)
+    empty = Order.objects.create(user=user)
+    OrderItem.objects.create(order=order, book=create_book(), price=10, quantity=2)
+    OrderItem.objects.create(order=order, book=create_book(), price=5.5, quantity=3)
+
+    with django_assert_num_queries(1):
+        totals = {
+            o.pk: (o.items_total_cost, o.items_total_quantity)
+            for o in Order.objects.with_totals()
+        }
+
+    assert totals[order.pk] == (Decimal("36.50"), 5)
+    assert totals[empty.pk] == (Decimal("0.00"), 0)
+
+
+@pytest.mark.django_db
+def test_order_rebuild_totals(create_user, create_book):
+    """Test the stored totals are recomputed from the order items."""
+    user = create_user(email="totals@test.com", password="pw")
+    order = Order.objects.create(user=user)
+    empty = Order.objects.create(user=user, total_cost=9, item_count=1)
+    OrderItem.objects.create(order=order, book=create_book(), price=10, quantity=2)
+    OrderItem.objects.create(order=order, book=create_book(), price=5.5, quantity=3)
+
+    assert Order.objects.rebuild_totals() == 2
+
+    order.refresh_from_db()
+    empty.refresh_from_db()
+    assert (order.total_cost, order.total_quantity, order.item_count) == (
+        Decimal("36.50"),
+        5,
+        2,
+    )
+    assert (empty.total_cost, empty.total_quantity, empty.item_count) == (0, 0, 0)
+
+
+@pytest.mark.django_db
+def test_backfill_order_totals_command(create_user, create_book):
+    """Test the backfill only touches orders without stored totals by default."""
+    user = create_user(email="backfill@test.com", password="pw")
+    old = Order.objects.create(user=user)
+    OrderItem.objects.create(order=old, book=create_book(), price=4, quantity=3)
+    recorded = Order.objects.create(user=user, total_cost=1, item_count=1)
+
+    call_command("backfill_order_totals", batch_size=1, stdout=StringIO())
+
+    old.refresh_from_db()
+    recorded.refresh_from_db()
+    assert (old.total_cost, old.total_quantity, old.item_count) == (12, 3, 1)
+    assert recorded.total_cost == 1
+
+    call_command("backfill_order_totals", all=True, stdout=StringIO())
+    recorded.refresh_from_db()
+    assert (recorded.total_cost, recorded.item_count) == (0, 0)
@@ -76,3 +76,7 @@ def test_create_order_serializer_success(create_user, create_book):
     assert item.book == book
     assert item.quantity == 2
     assert item.price == 100.00
+
+    # Check totals stored on the order
+    order.refresh_from_db()
+    assert (order.total_cost, order.total_quantity, order.item_count) == (200, 2, 1)
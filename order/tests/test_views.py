@@ -1,7 +1,10 @@
 import pytest
+from django.core.files.base import ContentFile
+from django.test import RequestFactory
 from django.urls import reverse
 from cart.models import Cart, CartItem
 from order.models import Order
+from order.views import order_receipt
 
 
 @pytest.mark.django_db
@@ -42,6 +45,7 @@ def test_order_create_view_converts_cart_to_order(client, create_user, create_bo
     assert order_item.book == book
     assert order_item.price == 50.00  # Price was locked in
     assert order_item.quantity == 2
+    assert (order.total_cost, order.total_quantity, order.item_count) == (100, 2, 1)
 
     # 5. Assert Redirect to Payment
     # The URL pattern requires an order_id to be valid.
@@ -145,3 +149,145 @@ def test_order_create_redirects_if_cart_empty(client, create_user):
     # Should redirect to shopping
     assert response.status_code == 302
     assert response.url == reverse("myApp:shopping")
+
+
+@pytest.mark.django_db
+def test_order_create_short_of_stock_returns_to_cart(client, create_user, create_book):
+    """Test a checkout the stock cannot cover sends the user back to the cart."""
+    user = create_user(email="scarce@test.com", password="pw")
+    client.force_login(user)
+    cart = Cart.objects.create(user=user)
+    CartItem.objects.create(cart=cart, book=create_book(stock=1), quantity=3)
+
+    payload = {"first_name": "Alice", "last_name": "Smith", "email": "alice@test.com"}
+    response = client.post(reverse("order:order_create"), payload)
+
+    assert response.status_code == 302
+    assert response.url == reverse("cart:cart_list")
+    assert Order.objects.count() == 0
+
+
+# --- RECEIPT DOWNLOADS ---
+
+RECEIPT = b"%PDF-receipt-bytes"
+
+
+@pytest.fixture
+def receipt_order(create_user, settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    settings.RECEIPT_SENDFILE = ""
+    user = create_user(email="owner@test.com", password="pw")
+    order = Order.objects.create(user=user, first_name="Ada", paid=True)
+    order.recipt_file.save("recipt_order.pdf", ContentFile(RECEIPT), save=False)
+    order.qr_file.save("qr.png", ContentFile(b"png"))
+    return order
+
+
+def download(response):
+    return b"".join(response.streaming_content)
+
+
+@pytest.mark.django_db
+def test_receipt_download_checks_owner_in_one_query(
+    receipt_order, django_assert_num_queries
+):
+    """Test the owner check is the only query the download makes."""
+    request = RequestFactory().get("/")
+    request.user = receipt_order.user
+
+    with django_assert_num_queries(1):
+        response = order_receipt(request, order_id=receipt_order.pk)
+
+    assert response.status_code == 200
+    assert download(response) == RECEIPT
+    assert response["Content-Type"] == "application/pdf"
+    assert response["Content-Disposition"].startswith("attachment;")
+    assert response["Accept-Ranges"] == "bytes"
+
+
+@pytest.mark.django_db
+def test_receipt_download_is_private(client, create_user, receipt_order):
+    """Test anonymous users log in first and other users get a 404."""
+    url = reverse("order:receipt", args=[receipt_order.pk])
+
+    response = client.get(url)
+    assert response.status_code == 302
+    assert "login" in response.url
+
+    client.force_login(create_user(email="other@test.com", password="pw"))
+    assert client.get(url).status_code == 404
+    qr_url = reverse("order:receipt_qr", args=[receipt_order.pk])
+    assert client.get(qr_url).status_code == 404
+
+
+@pytest.mark.django_db
+def test_receipt_download_without_file_is_404(client, receipt_order):
+    Order.objects.filter(pk=receipt_order.pk).update(recipt_file="")
+    client.force_login(receipt_order.user)
+
+    response = client.get(reverse("order:receipt", args=[receipt_order.pk]))
+
+    assert response.status_code == 404
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "header, status, body, content_range",
+    [
+        ("bytes=0-4", 206, RECEIPT[:5], f"bytes 0-4/{len(RECEIPT)}"),
+        ("bytes=5-", 206, RECEIPT[5:], f"bytes 5-{len(RECEIPT) - 1}/{len(RECEIPT)}"),
+        ("bytes=-5", 206, RECEIPT[-5:], None),
+        ("bytes=0-999", 206, RECEIPT, None),
+        ("bytes=0-1,4-5", 200, RECEIPT, None),
+        ("bytes=999-", 416, None, f"bytes */{len(RECEIPT)}"),
+    ],
+)
+def test_receipt_download_honours_range(
+    client, receipt_order, header, status, body, content_range
+):
+    """Test a single byte range is served as 206 and a bad one as 416."""
+    client.force_login(receipt_order.user)
+
+    response = client.get(
+        reverse("order:receipt", args=[receipt_order.pk]), HTTP_RANGE=header
+    )
+
+    assert response.status_code == status
+    if body is not None:
+        assert download(response) == body
+        assert int(response["Content-Length"]) == len(body)
+    if content_range:
+        assert response["Content-Range"] == content_range
+
+
+@pytest.mark.django_db
+def test_receipt_qr_is_served_inline(client, receipt_order):
+    client.force_login(receipt_order.user)
+
+    response = client.get(reverse("order:receipt_qr", args=[receipt_order.pk]))
+
+    assert response.status_code == 200
+    assert response["Content-Type"] == "image/png"
+    assert response["Content-Disposition"].startswith("inline;")
+
+
+@pytest.mark.django_db
+def test_receipt_download_hands_off_to_front_end_server(
+    client, receipt_order, settings
+):
+    """Test the file is left to nginx or Apache when sendfile is configured."""
+    client.force_login(receipt_order.user)
+    url = reverse("order:receipt", args=[receipt_order.pk])
+
+    settings.RECEIPT_SENDFILE = "x-accel-redirect"
+    response = client.get(url)
+    assert response.content == b""
+    assert response["X-Accel-Redirect"] == (
+        f"/protected-media/{receipt_order.recipt_file.name}"
+    )
+    assert response["Content-Disposition"].startswith("attachment;")
+
+    settings.RECEIPT_SENDFILE = "x-sendfile"
+    response = client.get(url)
+    assert response.content == b""
+    assert response["X-Sendfile"] == receipt_order.recipt_file.path
@@ -7,4 +7,6 @@ app_name = "order"
 urlpatterns = [
     path("create/", views.order_create, name="order_create"),
     path("my-order-list/", views.my_orders_list, name="my_orders_list"),
+    path("<int:order_id>/receipt/", views.order_receipt, name="receipt"),
+    path("<int:order_id>/receipt/qr/", views.order_receipt_qr, name="receipt_qr"),
 ]
@@ -1,8 +1,12 @@
-from django.shortcuts import render, redirect
+from django.shortcuts import get_object_or_404, render, redirect
+from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.http import Http404
 
+from .checkout import CheckoutError, place_order
+from .downloads import serve_file
 from .forms import OrderForm
-from .models import OrderItem, Order
+from .models import Order
 from cart.models import CartItem
 
 
@@ -16,17 +20,11 @@ def order_create(request):
     if request.method == "POST":
         form = OrderForm(request.POST)
         if form.is_valid():
-            order = form.save(commit=False)
-            order.user = request.user
-            order.save()
-
-            for item in cart_items:
-                OrderItem.objects.create(
-                    order=order,
-                    book=item.book,
-                    price=item.book.price,
-                    quantity=item.quantity,
-                )
+            try:
+                order = place_order(form.save(commit=False), request.user)
+            except CheckoutError as e:
+                messages.warning(request, str(e))
+                return redirect("cart:cart_list")
             return redirect("payment:process", order_id=order.id)
     else:
         form = OrderForm()
@@ -37,3 +35,25 @@ def order_create(request):
 def my_orders_list(request):
     orders = Order.objects.filter(user=request.user)
     return render(request, "order/my_orders_list.html", {"orders": orders})
+
+
+def _order_file(request, order_id, field, as_attachment):
+    # One primary-key lookup that also checks the owner, so someone else's
+    # order looks exactly like a missing one
+    order = get_object_or_404(
+        Order.objects.only("id", field), pk=order_id, user=request.user
+    )
+    field_file = getattr(order, field)
+    if not field_file:
+        raise Http404("This order has no receipt yet.")
+    return serve_file(request, field_file, as_attachment=as_attachment)
+
+
+@login_required
+def order_receipt(request, order_id):
+    return _order_file(request, order_id, "recipt_file", as_attachment=True)
+
+
+@login_required
+def order_receipt_qr(request, order_id):
+    return _order_file(request, order_id, "qr_file", as_attachment=False)
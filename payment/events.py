@@ -0,0 +1,82 @@
+"""
+State changes driven by Stripe events.
+
+These run in the process_stripe_event task, never in the webhook request,
+and work on the stored JSON payload rather than on a stripe object.
+"""
+
+import logging
+
+from django.db import transaction
+from django.db.models import Sum
+
+from cart.item_count import invalidate_cart_item_count
+from cart.models import CartItem
+from myApp.cache_versions import bump_book_card_versions
+from myApp.models import Book
+from order.models import Order
+
+logger = logging.getLogger(__name__)
+
+
+def fulfil_checkout_session(session):
+    """Mark the order paid, take its stock, clear the cart and send the receipt."""
+    if session.get("mode") != "payment" or session.get("payment_status") != "paid":
+        return
+
+    # Imported here because the task module imports this one
+    from .tasks import send_successful_payment_email
+
+    try:
+        order = Order.objects.select_for_update().get(
+            id=session.get("client_reference_id")
+        )
+    except (Order.DoesNotExist, ValueError):
+        logger.warning(
+            "Paid checkout session for unknown order %r",
+            session.get("client_reference_id"),
+        )
+        return
+    if order.paid:
+        return
+
+    # add the stripe_id and mark the order as paid
+    order.paid = True
+    order.stripe_id = session.get("payment_intent") or ""
+    order.save(update_fields=["paid", "stripe_id", "updated_at"])
+
+    # reduce the books from inventory
+    quantities = dict(
+        order.items.values("book_id")
+        .annotate(quantity=Sum("quantity"))
+        .values_list("book_id", "quantity")
+    )
+    levels = Book.objects.decrement_stock(quantities)
+    bump_book_card_versions(*quantities)
+    for book_id, level in levels.items():
+        if level.shortfall:
+            logger.warning(
+                "Order %s is paid but oversold book %s by %s",
+                order.id,
+                book_id,
+                level.shortfall,
+            )
+
+    # clear cart
+    CartItem.objects.filter(cart__user_id=order.user_id).delete()
+    invalidate_cart_item_count(order.user_id)
+
+    # Send recipt via email once the payment is committed
+    transaction.on_commit(lambda: send_successful_payment_email.delay(order.id))
+
+
+EVENT_HANDLERS = {
+    "checkout.session.completed": fulfil_checkout_session,
+}
+
+
+def handle_event(event_type, payload):
+    """Apply one Stripe event payload; types we don't handle are ignored."""
+    handler = EVENT_HANDLERS.get(event_type)
+    if handler is not None:
+        handler(payload["data"]["object"])
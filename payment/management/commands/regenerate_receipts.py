@@ -0,0 +1,187 @@
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from itertools import islice
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+from order.models import Order
+from payment.receipts import (
+    RECEIPT_TEMPLATE,
+    init_render_process,
+    render_receipt_files,
+)
+from payment.tasks import (
+    delete_replaced_files,
+    receipt_filenames,
+    replace_receipt_file,
+)
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_KEY = "regenerate-receipts:{since}"
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Regenerate the receipt PDF and QR code of paid orders, e.g. after "
+        "order/pdf.html changed. Progress is kept in the cache, so a run "
+        "that stops resumes after the last stored batch, and orders that "
+        "failed to render are retried by the next run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--since",
+            type=date.fromisoformat,
+            help="Only orders created on or after this date (YYYY-MM-DD).",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count(),
+            help="Processes rendering PDFs (default: one per CPU).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Orders fetched, rendered and stored together (default: 100).",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Render the receipts but store nothing and keep no progress.",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ignore the progress of an earlier run and start over.",
+        )
+
+    def handle(self, *args, **options):
+        since = options["since"]
+        dry_run = options["dry_run"]
+        batch_size = options["batch_size"]
+        workers = options["workers"]
+
+        orders = Order.objects.filter(paid=True)
+        if since:
+            orders = orders.filter(created_at__date__gte=since)
+
+        progress_key = PROGRESS_KEY.format(since=since or "all")
+        if options["restart"]:
+            cache.delete(progress_key)
+        progress = cache.get(progress_key) or {"last_id": 0, "failed": []}
+        last_id, retry = progress["last_id"], progress["failed"]
+        if last_id:
+            self.stdout.write(f"Resuming after order {last_id}.")
+        if retry:
+            self.stdout.write(f"Retrying {len(retry)} receipts that failed before.")
+
+        ids = (
+            orders.filter(Q(pk__gt=last_id) | Q(pk__in=retry))
+            .order_by("pk")
+            .values_list("pk", flat=True)
+            .iterator(chunk_size=batch_size)
+        )
+        rendered = 0
+        failed = []
+        started = time.perf_counter()
+
+        # Pool processes get HTML and return bytes; they never touch the
+        # database, so spawn them rather than fork this process's connections.
+        # Only they build the WeasyPrint renderer; here the template is enough
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_render_process,
+        ) as executor:
+            for batch in _batches(ids, batch_size):
+                batch_orders = Order.objects.prefetch_related("items__book").in_bulk(
+                    batch
+                )
+                futures = {}
+                for order_id, order in batch_orders.items():
+                    try:
+                        html = render_to_string(RECEIPT_TEMPLATE, {"order": order})
+                    except Exception:
+                        logger.exception("Could not render receipt %s", order_id)
+                        failed.append(order_id)
+                        continue
+                    futures[order_id] = executor.submit(
+                        render_receipt_files, order_id, html
+                    )
+                results = []
+                for order_id, future in futures.items():
+                    try:
+                        results.append(future.result())
+                    except Exception:
+                        logger.exception("Could not render receipt %s", order_id)
+                        failed.append(order_id)
+
+                rendered += len(results)
+                if not dry_run:
+                    self.store(batch_orders, results)
+                    last_id = max(last_id, batch[-1])
+                    # Earlier failures come first in pk order; keep those not
+                    # reached yet along with this run's, so a resume retries them
+                    pending = [pk for pk in retry if pk > batch[-1]]
+                    progress = {"last_id": last_id, "failed": failed + pending}
+                    cache.set(progress_key, progress, timeout=None)
+
+        if not dry_run:
+            if failed:
+                cache.set(
+                    progress_key, {"last_id": last_id, "failed": failed}, timeout=None
+                )
+            else:
+                cache.delete(progress_key)
+
+        elapsed = time.perf_counter() - started
+        rate = rendered / elapsed if elapsed else 0.0
+        action = "Rendered (dry run)" if dry_run else "Regenerated"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{action} {rendered} receipts with {workers} workers "
+                f"in {elapsed:.1f}s ({rate:.1f} receipts/s)."
+            )
+        )
+        if failed:
+            self.stderr.write(
+                f"Could not render {len(failed)} receipts, for orders "
+                f"{', '.join(map(str, failed))}."
+            )
+            if not dry_run:
+                self.stderr.write("Run the command again to retry them.")
+
+    @staticmethod
+    def store(orders, results):
+        """Save a batch of rendered files and point their orders at them."""
+        now = timezone.now()
+        replaced = {}
+        for order_id, pdf, qr in results:
+            order = orders[order_id]
+            pdf_filename, qr_filename = receipt_filenames(order_id)
+            replaced[order] = [
+                replace_receipt_file(order.recipt_file, pdf_filename, pdf),
+                replace_receipt_file(order.qr_file, qr_filename, qr),
+            ]
+            order.updated_at = now
+
+        Order.objects.bulk_update(replaced, ["recipt_file", "qr_file", "updated_at"])
+        # Only drop the old files once the orders point at the new ones
+        for order, old_names in replaced.items():
+            delete_replaced_files(order, old_names)
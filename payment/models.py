@@ -0,0 +1,18 @@
+from django.db import models
+
+
+class ProcessedStripeEvent(models.Model):
+    """
+    A verified Stripe webhook event. The row is written by the webhook view
+    and the event id is the primary key, so a retried delivery is recorded
+    once; processed_at is set by the task that applied it.
+    """
+
+    event_id = models.CharField(max_length=255, primary_key=True)
+    type = models.CharField(max_length=100)
+    payload = models.JSONField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.event_id
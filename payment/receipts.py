@@ -0,0 +1,105 @@
+"""
+Receipt PDF rendering.
+
+Parsing the stylesheet and discovering fonts cost about as much as laying
+out a receipt, so each worker process builds one ReceiptRenderer holding a
+parsed stylesheet and a shared FontConfiguration, and reuses it for every
+order. Each render logs how long the template, layout and write took.
+"""
+
+import logging
+import time
+from typing import NamedTuple
+
+import django
+import weasyprint
+from django.contrib.staticfiles import finders
+from django.template.loader import render_to_string
+from weasyprint.text.fonts import FontConfiguration
+
+logger = logging.getLogger(__name__)
+
+RECEIPT_TEMPLATE = "order/pdf.html"
+RECEIPT_STYLESHEET = "css/pdf.css"
+
+# One renderer per process, built on first use or when a worker process starts
+_renderer = None
+
+
+class RenderedReceipt(NamedTuple):
+    pdf: bytes
+    # Seconds spent in each stage: "template", "layout" and "write"
+    timings: dict
+
+
+class ReceiptRenderer:
+    def __init__(self, template_name=RECEIPT_TEMPLATE, stylesheet=RECEIPT_STYLESHEET):
+        self.template_name = template_name
+        self.font_config = FontConfiguration()
+        self.stylesheets = [
+            weasyprint.CSS(
+                filename=finders.find(stylesheet), font_config=self.font_config
+            )
+        ]
+
+    def render_html(self, order):
+        return render_to_string(self.template_name, {"order": order})
+
+    def render_pdf(self, html):
+        """
+        Lay out and write already rendered HTML. Needs no database access,
+        so it can run in a process that only has settings loaded.
+        """
+        return self._render_pdf(html)[0]
+
+    def _render_pdf(self, html):
+        started = time.perf_counter()
+        document = weasyprint.HTML(string=html).render(
+            stylesheets=self.stylesheets, font_config=self.font_config
+        )
+        laid_out = time.perf_counter()
+        pdf = document.write_pdf()
+        written = time.perf_counter()
+        return pdf, laid_out - started, written - laid_out
+
+    def render(self, order):
+        """Render order's receipt to PDF bytes, timing each stage."""
+        started = time.perf_counter()
+        html = self.render_html(order)
+        rendered = time.perf_counter()
+        pdf, layout, write = self._render_pdf(html)
+
+        timings = {"template": rendered - started, "layout": layout, "write": write}
+        logger.info(
+            "Rendered receipt for order %s: template %.1fms, layout %.1fms, "
+            "write %.1fms",
+            order.pk,
+            timings["template"] * 1000,
+            timings["layout"] * 1000,
+            timings["write"] * 1000,
+        )
+        return RenderedReceipt(pdf, timings)
+
+
+def get_receipt_renderer():
+    """Return this process's renderer, building it on first use."""
+    global _renderer
+    if _renderer is None:
+        _renderer = ReceiptRenderer()
+    return _renderer
+
+
+def init_render_process():
+    """
+    Initializer for pool processes that only render receipts: load the
+    settings and build the renderer, without touching the database.
+    """
+    django.setup()
+    get_receipt_renderer()
+
+
+def render_receipt_files(order_id, html):
+    """Render one receipt's PDF and QR code in a pool process."""
+    from .tasks import render_qr_png
+
+    return order_id, get_receipt_renderer().render_pdf(html), render_qr_png(order_id)
@@ -0,0 +1,219 @@
+from django import db
+from django.core.mail import EmailMessage
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+
+from celery import chord, group, shared_task
+from celery.signals import worker_process_init
+from kombu.exceptions import OperationalError
+from mailer.worker import queue_email
+from order.models import Order
+from .events import handle_event
+from .models import ProcessedStripeEvent
+
+import base64
+import logging
+import qrcode
+from datetime import timedelta
+from io import BytesIO
+
+logger = logging.getLogger(__name__)
+
+# Worth another attempt: the database was unreachable or a lock timed out
+TRANSIENT_ERRORS = (db.OperationalError, db.InterfaceError)
+
+# Unprocessed events are requeued once they are this old, for this long
+STRIPE_EVENT_GRACE = timedelta(minutes=10)
+STRIPE_EVENT_REQUEUE_WINDOW = timedelta(days=3)
+
+
+def receipt_filenames(order_id):
+    return f"recipt_order_{order_id}.pdf", f"qr_{order_id}.png"
+
+
+def receipt_url(order_id):
+    """The absolute URL the receipt QR code points at: its download view."""
+    return settings.SITE_URL + reverse("order:receipt", args=[order_id])
+
+
+def render_qr_png(order_id):
+    """PNG bytes of the QR code pointing at the order's receipt."""
+    qr_io = BytesIO()
+    qrcode.make(receipt_url(order_id)).save(qr_io)
+    return qr_io.getvalue()
+
+
+@worker_process_init.connect
+def _build_receipt_renderer(**kwargs):
+    # WeasyPrint is only imported by workers, never by the web process. Pay
+    # the font and stylesheet setup before the first task arrives, and after
+    # the fork so no process shares the parent's font state
+    from .receipts import get_receipt_renderer
+
+    get_receipt_renderer()
+
+
+def replace_receipt_file(field_file, filename, content):
+    """
+    Save content under the fixed receipt filename, overwriting a copy left
+    by an earlier attempt instead of getting a suffixed name next to it.
+    Returns the name the field pointed at before, for delete_replaced_files().
+    """
+    old_name = field_file.name
+    field_file.storage.delete(
+        field_file.field.generate_filename(field_file.instance, filename)
+    )
+    field_file.save(filename, ContentFile(content), save=False)
+    return old_name
+
+
+def delete_replaced_files(order, old_names):
+    """Delete files the order no longer points at, once it has been saved."""
+    current = {order.recipt_file.name, order.qr_file.name}
+    for name in old_names:
+        if name and name not in current:
+            order.recipt_file.storage.delete(name)
+
+
+def _encode(data):
+    # Stage results travel through the JSON serializer
+    return base64.b64encode(data).decode()
+
+
+@shared_task(autoretry_for=TRANSIENT_ERRORS, retry_backoff=True, max_retries=2)
+def render_receipt_pdf(order_id):
+    """Render the receipt PDF. CPU-bound; runs on the render queue."""
+    from .receipts import get_receipt_renderer
+
+    order = Order.objects.prefetch_related("items__book").get(id=order_id)
+    return _encode(get_receipt_renderer().render(order).pdf)
+
+
+@shared_task(autoretry_for=TRANSIENT_ERRORS, retry_backoff=True, max_retries=2)
+def render_receipt_qr(order_id):
+    """Render the QR code pointing at the receipt. Runs on the render queue."""
+    return _encode(render_qr_png(order_id))
+
+
+@shared_task(
+    autoretry_for=TRANSIENT_ERRORS + (OSError,), retry_backoff=True, max_retries=5
+)
+def store_receipt_files(rendered, order_id):
+    """
+    Chord body: save the PDF and QR code from the render stages to the order.
+    `rendered` holds the header results, in header order.
+    """
+    pdf_data, qr_data = rendered
+    pdf_filename, qr_filename = receipt_filenames(order_id)
+    order = Order.objects.get(id=order_id)
+    replaced = [
+        replace_receipt_file(
+            order.recipt_file, pdf_filename, base64.b64decode(pdf_data)
+        ),
+        replace_receipt_file(order.qr_file, qr_filename, base64.b64decode(qr_data)),
+    ]
+    order.save(update_fields=["recipt_file", "qr_file", "updated_at"])
+    delete_replaced_files(order, replaced)
+    return order_id
+
+
+@shared_task(
+    autoretry_for=(OperationalError, OSError), retry_backoff=True, max_retries=5
+)
+def send_receipt_email(order_id):
+    """
+    Build the receipt email from the stored files and hand it to the mail
+    worker's outbox (see mailer.worker). Runs on the mail queue.
+    """
+    order = Order.objects.get(id=order_id)
+
+    # Prepare email
+    subject = f"Book Store - Recipe no. {order_id}"
+    message = "Your Recipe and QR code have been attached to this email."
+    email = EmailMessage(subject, message, from_email=None, to=[order.email])
+
+    # ------------ ATTACH FILES TO EMAIL ------------
+    pdf_filename, qr_filename = receipt_filenames(order_id)
+    with order.recipt_file.open("rb") as pdf_file:
+        email.attach(pdf_filename, pdf_file.read(), "application/pdf")
+    with order.qr_file.open("rb") as qr_file:
+        email.attach(qr_filename, qr_file.read(), "image/png")
+
+    # Queue email; the mail worker sends it over a pooled SMTP connection
+    queue_email(email)
+
+
+def receipt_pipeline(order_id):
+    """
+    The receipt as a canvas: both renders run in parallel, and once both
+    are done the files are stored and then emailed. Each stage retries on
+    its own and is routed to its own queue (see CELERY_TASK_ROUTES). A
+    stage that finally fails stops the pipeline and is logged by
+    receipt_failed.
+    """
+    failed = receipt_failed.s(order_id)
+    renders = group(
+        render_receipt_pdf.s(order_id).on_error(failed),
+        render_receipt_qr.s(order_id).on_error(failed),
+    )
+    return chord(
+        renders,
+        store_receipt_files.s(order_id).on_error(failed)
+        | send_receipt_email.si(order_id).on_error(failed),
+    )
+
+
+@shared_task
+def receipt_failed(request, exc, traceback, order_id):
+    """Error callback for every receipt stage: the email will not go out."""
+    logger.error(
+        "Receipt for order %s failed in %s, no email sent: %r",
+        order_id,
+        request.task,
+        exc,
+    )
+
+
+@shared_task
+def send_successful_payment_email(order_id):
+    """Start the receipt pipeline for a paid order."""
+    receipt_pipeline(order_id).delay()
+
+
+@shared_task(autoretry_for=TRANSIENT_ERRORS, retry_backoff=True, max_retries=5)
+def process_stripe_event(event_id):
+    """
+    Apply a recorded Stripe event exactly once. The event row stays locked
+    until the changes commit, so a duplicate task waits and then skips it.
+    """
+    with transaction.atomic():
+        event = (
+            ProcessedStripeEvent.objects.select_for_update()
+            .filter(event_id=event_id, processed_at__isnull=True)
+            .first()
+        )
+        if event is None:
+            return
+        handle_event(event.type, event.payload)
+        event.processed_at = timezone.now()
+        event.save(update_fields=["processed_at"])
+
+
+@shared_task
+def requeue_stripe_events():
+    """
+    Beat job: queue events still unprocessed a while after they arrived,
+    e.g. because the worker died with the task or its retries ran out.
+    """
+    now = timezone.now()
+    event_ids = ProcessedStripeEvent.objects.filter(
+        processed_at__isnull=True,
+        received_at__lt=now - STRIPE_EVENT_GRACE,
+        received_at__gte=now - STRIPE_EVENT_REQUEUE_WINDOW,
+    ).values_list("event_id", flat=True)
+    for event_id in event_ids:
+        process_stripe_event.delay(event_id)
+    return len(event_ids)
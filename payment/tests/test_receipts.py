@@ -0,0 +1,286 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import StringIO
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.template.loader import render_to_string
+from django.utils import timezone
+from mailer.worker import MailWorker, SMTPConnectionPool
+from order.models import Order, OrderItem
+from payment import receipts
+from payment.receipts import (
+    ReceiptRenderer,
+    get_receipt_renderer,
+    render_receipt_files,
+)
+from payment.tasks import (
+    receipt_failed,
+    receipt_pipeline,
+    receipt_url,
+    render_receipt_pdf,
+    render_receipt_qr,
+    send_receipt_email,
+    store_receipt_files,
+)
+
+
+@pytest.fixture
+def paid_order(create_user, create_book):
+    user = create_user(email="receipt@test.com", password="pw")
+    order = Order.objects.create(
+        user=user, first_name="Ada", email="ada@test.com", paid=True
+    )
+    OrderItem.objects.create(
+        order=order, book=create_book(title="Receipt Book"), price=12, quantity=1
+    )
+    return order
+
+
+@pytest.mark.django_db
+def test_renderer_renders_pdf_with_stage_timings(paid_order, django_assert_num_queries):
+    """Test a prefetched order renders without queries and reports timings."""
+    order = Order.objects.prefetch_related("items__book").get(pk=paid_order.pk)
+
+    with django_assert_num_queries(0):
+        receipt = ReceiptRenderer().render(order)
+
+    assert receipt.pdf.startswith(b"%PDF")
+    assert set(receipt.timings) == {"template", "layout", "write"}
+    assert all(seconds >= 0 for seconds in receipt.timings.values())
+
+
+def test_renderer_is_built_once_per_process(monkeypatch):
+    """Test the stylesheet and fonts are set up once and then reused."""
+    monkeypatch.setattr(receipts, "_renderer", None)
+
+    renderer = get_receipt_renderer()
+
+    assert get_receipt_renderer() is renderer
+    assert renderer.stylesheets and renderer.font_config is not None
+
+
+def test_receipt_pipeline_shape():
+    """Test both renders run in parallel before storage and then email."""
+    pipeline = receipt_pipeline(7)
+
+    assert [sig.task for sig in pipeline.tasks] == [
+        "payment.tasks.render_receipt_pdf",
+        "payment.tasks.render_receipt_qr",
+    ]
+    assert [sig.task for sig in pipeline.body.tasks] == [
+        "payment.tasks.store_receipt_files",
+        "payment.tasks.send_receipt_email",
+    ]
+    # Every stage reports a final failure instead of silently dropping it
+    for sig in [*pipeline.tasks, *pipeline.body.tasks]:
+        [errback] = sig.options["link_error"]
+        assert errback["task"] == "payment.tasks.receipt_failed"
+        assert errback["args"] == (7,)
+
+
+def test_receipt_failed_logs_the_order(caplog):
+    request = SimpleNamespace(task="payment.tasks.render_receipt_pdf")
+
+    receipt_failed(request, ValueError("bad template"), None, 7)
+
+    assert "Receipt for order 7 failed in payment.tasks.render_receipt_pdf" in (
+        caplog.text
+    )
+
+
+@pytest.mark.django_db
+def test_render_does_not_retry_a_missing_order():
+    """Test deterministic failures fail at once instead of being retried."""
+    with (
+        patch.object(render_receipt_pdf, "retry") as retry,
+        pytest.raises(Order.DoesNotExist),
+    ):
+        render_receipt_pdf(999)
+
+    retry.assert_not_called()
+
+
+def test_receipt_url_points_at_download_view(settings):
+    """Test the QR code links to the authenticated download, not the media."""
+    settings.SITE_URL = "https://books.example.com"
+
+    assert receipt_url(7) == "https://books.example.com/order/7/receipt/"
+
+
+@pytest.mark.django_db
+def test_receipt_stages_store_and_email(
+    paid_order, settings, tmp_path, mailoutbox, memory_broker
+):
+    """Test the stages, run in pipeline order, save both files and mail them."""
+    settings.MEDIA_ROOT = tmp_path
+    order_id = paid_order.pk
+
+    rendered = [render_receipt_pdf(order_id), render_receipt_qr(order_id)]
+    assert store_receipt_files(rendered, order_id) == order_id
+    # A retried store overwrites its files rather than adding suffixed copies
+    assert store_receipt_files(rendered, order_id) == order_id
+    assert sorted(p.name for p in tmp_path.rglob("*.*")) == [
+        f"qr_{order_id}.png",
+        f"recipt_order_{order_id}.pdf",
+    ]
+    send_receipt_email(order_id)
+    # The email is only queued; the mail worker sends it
+    assert mailoutbox == []
+    MailWorker(SMTPConnectionPool(), wait=0.01).run(until_empty=True)
+
+    paid_order.refresh_from_db()
+    assert paid_order.recipt_file.name.startswith("recipts/")
+    assert paid_order.qr_file.name.startswith("qr_files/")
+    assert paid_order.recipt_file.read().startswith(b"%PDF")
+
+    assert len(mailoutbox) == 1
+    attachments = [name for name, _, _ in mailoutbox[0].attachments]
+    assert attachments == [f"recipt_order_{order_id}.pdf", f"qr_{order_id}.png"]
+
+
+@pytest.fixture
+def receipt_orders(paid_order, create_book):
+    """Three paid orders, oldest first, plus an unpaid one."""
+    orders = [paid_order]
+    for _ in range(2):
+        order = Order.objects.create(
+            user=paid_order.user, first_name="Ada", email="ada@test.com", paid=True
+        )
+        OrderItem.objects.create(order=order, book=create_book(), price=5, quantity=2)
+        orders.append(order)
+    Order.objects.create(user=paid_order.user, first_name="Ada", email="a@test.com")
+    return orders
+
+
+def regenerate(*args):
+    out, err = StringIO(), StringIO()
+    call_command("regenerate_receipts", *args, stdout=out, stderr=err)
+    return out.getvalue(), err.getvalue()
+
+
+@pytest.mark.django_db
+def test_regenerate_receipts_in_worker_processes(receipt_orders, settings, tmp_path):
+    """Test every paid order gets fresh files rendered by the process pool."""
+    settings.MEDIA_ROOT = tmp_path
+    old = receipt_orders[0]
+    old.recipt_file.save("old.pdf", ContentFile(b"old"))
+
+    out, err = regenerate("--workers=2", "--batch-size=2")
+
+    assert "Regenerated 3 receipts with 2 workers" in out
+    assert "receipts/s" in out
+    assert err == ""
+    for order in Order.objects.filter(paid=True):
+        pdf_filename, qr_filename = f"recipt_order_{order.pk}.pdf", f"qr_{order.pk}.png"
+        assert order.recipt_file.name == f"recipts/{pdf_filename}"
+        assert order.qr_file.name == f"qr_files/{qr_filename}"
+        assert order.recipt_file.read().startswith(b"%PDF")
+    assert not (tmp_path / "recipts" / "old.pdf").exists()
+    assert Order.objects.filter(paid=False, recipt_file="").exists()
+    # A finished run leaves no progress behind
+    assert cache.get("regenerate-receipts:all") is None
+
+
+@pytest.mark.django_db
+def test_regenerate_receipts_resumes_since_and_dry_run(
+    receipt_orders, settings, tmp_path
+):
+    """Test --since, resuming after stored progress and --dry-run."""
+    settings.MEDIA_ROOT = tmp_path
+    first, second, third = receipt_orders
+    Order.objects.filter(pk=first.pk).update(
+        created_at=timezone.now() - timedelta(days=30)
+    )
+    since = (timezone.now() - timedelta(days=1)).date()
+
+    out, _ = regenerate("--workers=1", f"--since={since}", "--dry-run")
+    assert "Rendered (dry run) 2 receipts" in out
+    assert not Order.objects.exclude(recipt_file="").exists()
+
+    # A run that stopped after storing the second order picks up after it
+    cache.set(f"regenerate-receipts:{since}", {"last_id": second.pk, "failed": []})
+    out, _ = regenerate("--workers=1", f"--since={since}")
+
+    assert f"Resuming after order {second.pk}." in out
+    assert "Regenerated 1 receipts" in out
+    assert list(Order.objects.exclude(recipt_file="").values_list("pk", flat=True)) == [
+        third.pk
+    ]
+
+
+@pytest.mark.django_db
+def test_regenerate_receipts_retries_failed_orders(receipt_orders, settings, tmp_path):
+    """Test progress past a failed order keeps it, so the next run retries it."""
+    settings.MEDIA_ROOT = tmp_path
+    first, second, third = receipt_orders
+    command = "payment.management.commands.regenerate_receipts"
+
+    def render_or_fail(order_id, html):
+        if order_id == second.pk:
+            raise ValueError("bad template")
+        return render_receipt_files(order_id, html)
+
+    # Threads instead of spawned processes, so the patched render is used
+    with (
+        patch(
+            f"{command}.ProcessPoolExecutor",
+            lambda max_workers, mp_context, initializer: ThreadPoolExecutor(
+                max_workers
+            ),
+        ),
+        patch(f"{command}.render_receipt_files", render_or_fail),
+    ):
+        _, err = regenerate("--workers=1", "--batch-size=2")
+
+    assert f"for orders {second.pk}." in err
+    assert cache.get("regenerate-receipts:all") == {
+        "last_id": third.pk,
+        "failed": [second.pk],
+    }
+    assert not Order.objects.filter(pk=second.pk).exclude(recipt_file="").exists()
+
+    out, err = regenerate("--workers=1", "--batch-size=2")
+
+    assert "Retrying 1 receipts that failed before." in out
+    assert "Regenerated 1 receipts" in out
+    assert err == ""
+    assert Order.objects.filter(paid=True, recipt_file="").count() == 0
+    assert cache.get("regenerate-receipts:all") is None
+
+
+@pytest.mark.django_db
+def test_regenerate_receipts_template_error_fails_one_order(
+    receipt_orders, settings, tmp_path
+):
+    """Test a template error fails its order only, and WeasyPrint stays out."""
+    settings.MEDIA_ROOT = tmp_path
+    first, second, third = receipt_orders
+    command = "payment.management.commands.regenerate_receipts"
+
+    def render_or_fail(template_name, context):
+        if context["order"].pk == second.pk:
+            raise ValueError("bad data")
+        return render_to_string(template_name, context)
+
+    with (
+        patch(f"{command}.render_to_string", render_or_fail),
+        patch.object(receipts, "_renderer", None),
+        patch.object(receipts, "ReceiptRenderer") as renderer_class,
+    ):
+        out, err = regenerate("--workers=1", "--batch-size=3")
+
+    # Only the spawned pool processes build a renderer
+    renderer_class.assert_not_called()
+    assert "Regenerated 2 receipts" in out
+    assert f"for orders {second.pk}." in err
+    assert cache.get("regenerate-receipts:all") == {
+        "last_id": third.pk,
+        "failed": [second.pk],
+    }
+    stored = Order.objects.exclude(recipt_file="").values_list("pk", flat=True)
+    assert sorted(stored) == [first.pk, third.pk]
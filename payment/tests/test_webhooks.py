@@ -1,13 +1,19 @@
 import pytest
 import json
+from datetime import timedelta
 from unittest.mock import patch, MagicMock
 from django.urls import reverse
+from django.utils import timezone
 from order.models import Order, OrderItem
 from cart.models import Cart, CartItem
+from payment.models import ProcessedStripeEvent
+from payment.tasks import process_stripe_event, requeue_stripe_events
 
 
 @pytest.mark.django_db
-def test_stripe_webhook_success_flow(client, create_user, create_book):
+def test_stripe_webhook_success_flow(
+    client, create_user, create_book, django_capture_on_commit_callbacks
+):
     """
     Simulate a 'checkout.session.completed' event from Stripe.
     Verify that Order is paid, Stock reduced, Cart cleared, and Email sent.
@@ -45,15 +51,18 @@ def test_stripe_webhook_success_flow(client, create_user, create_book):
     # 3. MOCK EVERYTHING
     # We need to mock:
     # A. Stripe Signature Verification (so it accepts our fake payload)
-    # B. The Celery Task (so we don't need Redis running)
+    # B. The Celery Tasks (so we don't need Redis running); the event task
+    #    runs inline, the email task is only recorded
 
     with patch("stripe.Webhook.construct_event") as mock_verify, patch(
-        "payment.webhooks.send_successful_payment_email.delay"
-    ) as mock_task:
+        "payment.webhooks.process_stripe_event.delay",
+        side_effect=process_stripe_event,
+    ), patch("payment.tasks.send_successful_payment_email.delay") as mock_task:
 
         # Configure the verification mock to return our payload as an object
         # (Stripe library converts JSON dict to an object with dot notation)
         class FakeEvent:
+            id = payload["id"]
             type = payload["type"]
             data = MagicMock()
 
@@ -70,12 +79,13 @@ def test_stripe_webhook_success_flow(client, create_user, create_book):
         mock_verify.return_value = fake_event
 
         # 4. SEND REQUEST
-        response = client.post(
-            url,
-            data=json.dumps(payload),
-            content_type="application/json",
-            HTTP_STRIPE_SIGNATURE="fake_signature",
-        )
+        with django_capture_on_commit_callbacks(execute=True):
+            response = client.post(
+                url,
+                data=json.dumps(payload),
+                content_type="application/json",
+                HTTP_STRIPE_SIGNATURE="fake_signature",
+            )
 
         # 5. ASSERTIONS
         assert response.status_code == 200
@@ -94,3 +104,140 @@ def test_stripe_webhook_success_flow(client, create_user, create_book):
 
         # Check Email Task Triggered
         mock_task.assert_called_once_with(order.id)
+
+
+@pytest.mark.django_db
+def test_stripe_webhook_records_event_once(
+    client, create_user, django_capture_on_commit_callbacks
+):
+    """Test a redelivered event is stored once and queued until processed."""
+    user = create_user(email="retry@test.com", password="pw")
+    order = Order.objects.create(user=user, paid=False)
+    payload = {
+        "id": "evt_retry",
+        "type": "checkout.session.completed",
+        "data": {"object": {"client_reference_id": str(order.id)}},
+    }
+    event = MagicMock(id="evt_retry", type="checkout.session.completed")
+
+    def deliver():
+        with django_capture_on_commit_callbacks(execute=True):
+            response = client.post(
+                reverse("payment:stripe-webhook"),
+                data=json.dumps(payload),
+                content_type="application/json",
+                HTTP_STRIPE_SIGNATURE="fake_signature",
+            )
+        assert response.status_code == 200
+
+    with patch("stripe.Webhook.construct_event", return_value=event), patch(
+        "payment.webhooks.process_stripe_event.delay"
+    ) as mock_task:
+        deliver()
+        # The first task never ran, so the redelivery queues it again
+        deliver()
+        assert mock_task.call_count == 2
+
+        stored = ProcessedStripeEvent.objects.get()
+        assert stored.payload == payload
+        assert stored.processed_at is None
+
+        # The request itself changes nothing
+        order.refresh_from_db()
+        assert order.paid is False
+
+        stored.processed_at = timezone.now()
+        stored.save()
+        deliver()
+        assert mock_task.call_count == 2
+
+
+@pytest.mark.django_db
+def test_requeue_stripe_events_picks_up_stuck_events():
+    """Test only events left unprocessed past the grace period are requeued."""
+    now = timezone.now()
+    for event_id, age, processed in [
+        ("evt_stuck", timedelta(hours=1), False),
+        ("evt_fresh", timedelta(minutes=1), False),
+        ("evt_done", timedelta(hours=1), True),
+        ("evt_ancient", timedelta(days=30), False),
+    ]:
+        ProcessedStripeEvent.objects.create(
+            event_id=event_id,
+            type="checkout.session.completed",
+            payload={},
+            processed_at=now if processed else None,
+        )
+        ProcessedStripeEvent.objects.filter(event_id=event_id).update(
+            received_at=now - age
+        )
+
+    with patch("payment.tasks.process_stripe_event.delay") as mock_task:
+        assert requeue_stripe_events() == 1
+
+    mock_task.assert_called_once_with("evt_stuck")
+
+
+@pytest.mark.django_db
+def test_process_stripe_event_is_idempotent(create_user, create_book):
+    """Test running the task twice for one event takes stock only once."""
+    user = create_user(email="twice@test.com", password="pw")
+    book = create_book(stock=10)
+    order = Order.objects.create(user=user, paid=False)
+    OrderItem.objects.create(order=order, book=book, price=10, quantity=3)
+    ProcessedStripeEvent.objects.create(
+        event_id="evt_twice",
+        type="checkout.session.completed",
+        payload={
+            "data": {
+                "object": {
+                    "mode": "payment",
+                    "payment_status": "paid",
+                    "client_reference_id": str(order.id),
+                    "payment_intent": "pi_twice",
+                }
+            }
+        },
+    )
+
+    with patch("payment.tasks.send_successful_payment_email.delay"):
+        process_stripe_event("evt_twice")
+        process_stripe_event("evt_twice")
+
+    book.refresh_from_db()
+    order.refresh_from_db()
+    assert book.stock == 7
+    assert order.paid is True
+    assert ProcessedStripeEvent.objects.get().processed_at is not None
+
+
+@pytest.mark.django_db
+def test_oversold_paid_order_is_logged(create_user, create_book, caplog):
+    """Test a paid order taking more than the stock left leaves a warning."""
+    user = create_user(email="oversold@test.com", password="pw")
+    scarce = create_book(title="Scarce", stock=1)
+    plenty = create_book(title="Plenty", stock=10)
+    order = Order.objects.create(user=user, paid=False)
+    OrderItem.objects.create(order=order, book=scarce, price=10, quantity=3)
+    OrderItem.objects.create(order=order, book=plenty, price=10, quantity=2)
+    ProcessedStripeEvent.objects.create(
+        event_id="evt_oversold",
+        type="checkout.session.completed",
+        payload={
+            "data": {
+                "object": {
+                    "mode": "payment",
+                    "payment_status": "paid",
+                    "client_reference_id": str(order.id),
+                }
+            }
+        },
+    )
+
+    with patch("payment.tasks.send_successful_payment_email.delay"):
+        process_stripe_event("evt_oversold")
+
+    scarce.refresh_from_db()
+    assert scarce.stock == 0
+    warnings = [r.getMessage() for r in caplog.records if r.levelname == "WARNING"]
+    assert warnings == [f"Order {order.id} is paid but oversold book {scarce.id} by 2"]
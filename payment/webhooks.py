@@ -1,15 +1,23 @@
+import json
+
 import stripe
 from django.conf import settings
+from django.db import transaction
 from django.http import HttpResponse
 from django.views.decorators.csrf import csrf_exempt
 import stripe.error
-from order.models import Order
-from cart.models import Cart
-from .task import send_successful_payment_email
+from .models import ProcessedStripeEvent
+from .tasks import process_stripe_event
 
 
 @csrf_exempt
 def stripe_webhook(request):
+    """
+    Verify and record the event, then hand it to a task. Nothing else runs in
+    the request, so Stripe gets its 200 quickly. A redelivered event is only
+    queued again while its row is still unprocessed; the task skips events
+    that were already applied.
+    """
     payload = request.body
     sig_header = request.META.get("HTTP_STRIPE_SIGNATURE")
     if sig_header is None:
@@ -26,30 +34,11 @@ def stripe_webhook(request):
     except stripe.error.SignatureVerificationError:
         return HttpResponse(status=400)
 
-    if event.type == "checkout.session.completed":
-        session = event.data.object
-        if session.mode == "payment" and session.payment_status == "paid":
-            try:
-                order = Order.objects.get(id=session.client_reference_id)
-            except Order.DoesNotExist:
-                return HttpResponse(status=404)
-
-            # add the stripe_id and mark the order as paid
-            order.paid = True
-            order.stripe_id = session.payment_intent
-            order.save()
-
-            # Send recipt via email
-            send_successful_payment_email.delay(order.id)
-
-            # recude the books from inventory
-            for item in order.items.all():
-                item.book.stock -= item.quantity
-                item.book.save()
-
-            # clear cart
-            cart = Cart.objects.filter(user=order.user).first()
-            if cart:
-                cart.items.all().delete()
+    stored, _ = ProcessedStripeEvent.objects.get_or_create(
+        event_id=event.id,
+        defaults={"type": event.type, "payload": json.loads(payload)},
+    )
+    if stored.processed_at is None:
+        transaction.on_commit(lambda: process_stripe_event.delay(event.id))
 
     return HttpResponse(status=200)